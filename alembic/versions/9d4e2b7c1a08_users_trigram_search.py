@@ -0,0 +1,37 @@
+"""users trigram search
+
+Revision ID: 9d4e2b7c1a08
+Revises: 5a1c0f3b2e71
+Create Date: 2026-10-18 16:52:10.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4e2b7c1a08'
+down_revision: Union[str, None] = '5a1c0f3b2e71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_COLUMNS = ("first_name", "last_name", "email")
+
+
+def upgrade() -> None:
+    # pg_trgm only exists on postgres, sqlite databases fall back to the like search backend
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for column in SEARCH_COLUMNS:
+        op.create_index(f'ix_users_{column}_trgm', 'users', [column], unique=False,
+                        postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for column in reversed(SEARCH_COLUMNS):
+        op.drop_index(f'ix_users_{column}_trgm', table_name='users')
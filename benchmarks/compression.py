@@ -0,0 +1,59 @@
+"""Bytes saved vs. CPU spent per encoder and level on GET /users listing bodies.
+
+    python -m benchmarks.compression [iterations]
+
+Bodies are rendered exactly as the endpoint renders them (FastJSONResponse of a ListView of
+UserMiniView). brotli and zstd rows only appear when their optional packages are installed.
+The defaults in src/settings.py (COMPRESSION_*_LEVEL, COMPRESSION_MIN_SIZE) come from this table.
+"""
+import statistics
+import sys
+import time
+
+from benchmarks.list_serialization import listing
+from src.utils.compression import BrotliEncoder, GzipEncoder, ZstdEncoder
+from src.utils.responses import FastJSONResponse
+
+SIZES = (1, 10, 100, 1000)
+LEVELS = {
+    "gzip": (GzipEncoder, (1, 3, 4, 5, 6, 9)),
+    "br": (BrotliEncoder, (1, 3, 4, 5, 6, 11)),
+    "zstd": (ZstdEncoder, (1, 3, 6, 9, 19)),
+}
+
+
+def encoders():
+    for name, (cls, levels) in LEVELS.items():
+        for level in levels:
+            try:
+                yield name, level, cls(level)
+            except ImportError:
+                break
+
+
+def timed(fn, iterations: int) -> float:
+    runs = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        runs.append((time.perf_counter() - start) / iterations * 1e6)
+    return statistics.median(runs)
+
+
+def run(iterations: int):
+    bodies = {size: FastJSONResponse(content=listing(size)).body for size in SIZES}
+    print(f"{'items':>6}{'bytes':>9}{'coding':>8}{'level':>6}{'out':>9}{'ratio':>8}{'us':>10}{'MB/s':>9}"
+          f"{'saved B/us':>12}")
+    for size, body in bodies.items():
+        count = max(1, iterations // size)
+        for name, level, encoder in encoders():
+            out = len(encoder.compress(body))
+            micros = timed(lambda: encoder.compress(body), count)
+            print(f"{size:>6}{len(body):>9}{name:>8}{level:>6}{out:>9}{len(body) / out:>8.2f}{micros:>10.1f}"
+                  f"{len(body) / micros:>9.1f}{(len(body) - out) / micros:>12.1f}")
+        print()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
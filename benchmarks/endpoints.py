@@ -0,0 +1,221 @@
+"""Throughput and p50/p99 latency of the auth and users endpoints, app served in-process.
+
+    python -m benchmarks.endpoints --users 10000 --requests 500 --concurrency 16
+    python -m benchmarks.endpoints --compare benchmarks/results/endpoints-<previous>.json
+
+DEF_SQL_URI picks the database, a throwaway sqlite file is used when it is not
+set. Point it at a dedicated postgres database, the users table is emptied and
+seeded with --users rows before the run. The shared response cache is off
+unless --cache is given, so listings measure the query path, and the login
+rate limiter is off unless DEF_RATE_LIMIT_ENABLED says otherwise. Results are
+written as JSON under benchmarks/results/ and --compare prints the change
+against an earlier run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from uuid import uuid4
+
+RESULTS_DIR = Path(__file__).parent / "results"
+PASSWORD = "bench-password"
+PAGE_SIZE = 20
+
+
+def configure(args):
+    # settings are read at import time, so the environment is prepared before src is imported
+    if "DEF_SQL_URI" not in os.environ:
+        os.environ["DEF_SQL_URI"] = f"sqlite+aiosqlite:///{tempfile.gettempdir()}/benchmark-endpoints.db"
+    if not args.cache:
+        os.environ["DEF_CACHE_BACKEND"] = "none"
+    # every request comes from one client address
+    os.environ.setdefault("DEF_RATE_LIMIT_ENABLED", "false")
+    # the benchmark database is throwaway, build it from the models instead of migrating it
+    os.environ.setdefault("DEF_DB_SCHEMA_MODE", "create")
+
+
+async def seed(users: int):
+    from sqlalchemy import delete, insert
+
+    from src.users.user.models import User
+    from src.utils.password_hasher import password_hasher
+    from src.utils.single_psql_db import SessionLocal
+
+    hashed = await password_hasher.hash(PASSWORD)
+    async with SessionLocal() as db:
+        await db.execute(delete(User))
+        now = datetime.utcnow()
+        for start in range(0, users, 1000):
+            rows = [dict(id=uuid4(), email=f"user{i}@example.com", first_name=f"First{i}", last_name=f"Last{i}",
+                         password=hashed, is_active=True, is_superuser=i == 0, created_at=now, updated_at=now)
+                    for i in range(start, min(start + 1000, users))]
+            await db.execute(insert(User.__table__), rows)
+        await db.commit()
+
+
+def percentile(timings, fraction: float) -> float:
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+async def run_scenario(client, request, total: int, concurrency: int) -> dict:
+    timings, statuses = [], {}
+    remaining = iter(range(total))
+
+    async def worker():
+        for index in remaining:
+            start = time.perf_counter()
+            response = await request(client, index)
+            timings.append((time.perf_counter() - start) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    wall = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - wall
+    timings.sort()
+    return {
+        "requests": total,
+        "errors": sum(count for status, count in statuses.items() if status >= 400),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "rps": total / wall,
+        "mean_ms": statistics.fmean(timings),
+        "p50_ms": percentile(timings, 0.50),
+        "p99_ms": percentile(timings, 0.99),
+        "max_ms": timings[-1],
+    }
+
+
+def scenarios(users: int, run_id: str, user_ids: list, etag: str):
+    user_id = user_ids[0]
+    deep_page = max(1, users // PAGE_SIZE - 1)
+
+    def sign_in(client, index):
+        return client.post("/auth/sign-in", json={"identifier": f"user{index % users}@example.com",
+                                                   "password": PASSWORD})
+
+    def me(client, index):
+        return client.get("/auth/me")
+
+    def list_users(params):
+        return lambda client, index: client.get("/users", params=params)
+
+    def get_user(headers):
+        return lambda client, index: client.get(f"/users/{user_id}", headers=headers)
+
+    def batch_get(client, index):
+        return client.post("/users/batch-get", json={"ids": user_ids})
+
+    def create_user(client, index):
+        return client.post("/users", json={"email": f"bench-{run_id}-{index}@example.com", "password": PASSWORD,
+                                           "first_name": "Bench", "last_name": "User"})
+
+    # (name, request, share of --requests), sign-in is bcrypt bound so it gets fewer requests
+    return [
+        ("sign-in", sign_in, 0.1),
+        ("me", me, 1),
+        ("users-shallow", list_users({"page": 1, "pageSize": PAGE_SIZE}), 1),
+        ("users-deep", list_users({"page": deep_page, "pageSize": PAGE_SIZE}), 1),
+        ("users-keyset", list_users({"keyset": True, "pageSize": PAGE_SIZE}), 1),
+        ("users-search-shallow", list_users({"search": "user12", "page": 1, "pageSize": PAGE_SIZE}), 1),
+        ("users-search-deep", list_users({"search": "user1", "page": max(1, deep_page // 10),
+                                          "pageSize": PAGE_SIZE}), 1),
+        ("user-get", get_user({}), 1),
+        # a client revalidating a copy it already holds, answered with 304 from updated_at alone
+        ("user-get-304", get_user({"If-None-Match": etag}), 1),
+        # the same ids a client would otherwise fetch with one GET /users/{id} each
+        ("users-batch-get", batch_get, 1),
+        ("users-create", create_user, 0.5),
+    ]
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current: dict, previous_path: Path):
+    previous = json.loads(previous_path.read_text())["results"]
+    print(f"\nvs {previous_path.name}")
+    print(f"{'scenario':<22}{'rps':>10}{'p50':>10}{'p99':>10}")
+    for name, result in current["results"].items():
+        before = previous.get(name)
+        if before is None:
+            continue
+        change = lambda key: (result[key] / before[key] - 1) * 100 if before[key] else 0.0
+        print(f"{name:<22}{change('rps'):>+9.1f}%{change('p50_ms'):>+9.1f}%{change('p99_ms'):>+9.1f}%")
+
+
+async def main(args):
+    import httpx
+
+    from src.main import app
+    from src.settings import config
+    from src.utils.single_psql_db import engine
+
+    await app.router.startup()
+    await seed(args.users)
+    run_id = uuid4().hex[:8]
+    results = {}
+    # a failing endpoint shows up as 500s in the results instead of aborting the run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        response = await client.post("/auth/sign-in", json={"identifier": "user0@example.com", "password": PASSWORD})
+        response.raise_for_status()
+        client.cookies.set("Authorization", response.json()["details"])
+        response = await client.get("/users", params={"pageSize": PAGE_SIZE})
+        user_ids = [user["id"] for user in response.json()["details"]["items"]]
+        response = await client.get(f"/users/{user_ids[0]}")
+        etag = response.headers["etag"]
+
+        print(f"{'scenario':<22}{'requests':>9}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for name, request, share in scenarios(args.users, run_id, user_ids, etag):
+            total = max(args.concurrency, int(args.requests * share))
+            result = results[name] = await run_scenario(client, request, total, args.concurrency)
+            print(f"{name:<22}{result['requests']:>9}{result['errors']:>8}{result['rps']:>10.1f}"
+                  f"{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}")
+
+    await app.router.shutdown()
+    await engine.dispose()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "database": engine.dialect.name,
+            "python": platform.python_version(),
+            "users": args.users,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "cache": config.CACHE_BACKEND,
+        },
+        "results": results,
+    }
+    output = args.output or RESULTS_DIR / f"endpoints-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nresults written to {output}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--cache", action="store_true", help="keep the shared response cache on")
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path, help="earlier results file to diff against")
+    args = parser.parse_args()
+    configure(args)
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,36 @@
+"""Cold vs. warm access token decode throughput.
+
+    python -m benchmarks.jwt_decode [iterations]
+"""
+import sys
+import time
+
+from src.auth.base.service import AuthService
+from src.auth.current_user import decode_access_token, decoded_token_cache
+from src.settings import config
+
+
+def run(iterations: int):
+    token = AuthService.create_access_token(data={"sub": "bench@example.com"},
+                                            expires_delta=config.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        decoded_token_cache.clear()
+        decode_access_token(token)
+    cold = time.perf_counter() - start
+
+    decode_access_token(token)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        decode_access_token(token)
+    warm = time.perf_counter() - start
+
+    print(f"iterations: {iterations}")
+    print(f"cold: {iterations / cold:>12,.0f} decodes/s  {cold / iterations * 1e6:8.2f} us/decode")
+    print(f"warm: {iterations / warm:>12,.0f} decodes/s  {warm / iterations * 1e6:8.2f} us/decode")
+    print(f"speedup: {cold / warm:.1f}x")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,44 @@
+"""Render cost of a GET /users body, JSONResponse(model_dump()) vs. FastJSONResponse.
+
+    python -m benchmarks.list_serialization [iterations]
+"""
+import sys
+import time
+from uuid import uuid4
+
+from fastapi.responses import JSONResponse
+
+from src.users.user.schemas import UserMiniView
+from src.utils.pagination import get_pagination_info
+from src.utils.responses import FastJSONResponse
+from src.utils.schemas import GeneralResponse, ListView
+
+
+def listing(size: int) -> GeneralResponse:
+    items = [UserMiniView(id=uuid4(), email=f"user{i}@example.com", first_name=f"First{i}", last_name=f"Last{i}")
+             for i in range(size)]
+    info = get_pagination_info(total_items=size * 10, current_page=1, page_size=size)
+    return GeneralResponse(status=200, message="Users listed.", details=ListView[UserMiniView](info=info, items=items))
+
+
+def timed(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def run(iterations: int):
+    print(f"{'items':>6}{'JSONResponse us':>18}{'FastJSONResponse us':>22}{'speedup':>10}")
+    for size in (10, 100, 1000):
+        content = listing(size)
+        assert JSONResponse(content=content.model_dump()).body.replace(b" ", b"") == \
+               FastJSONResponse(content=content).body.replace(b" ", b"")
+        count = max(1, iterations // size)
+        stdlib = timed(lambda: JSONResponse(status_code=200, content=content.model_dump()), count)
+        fast = timed(lambda: FastJSONResponse(status_code=200, content=content), count)
+        print(f"{size:>6}{stdlib:>18.1f}{fast:>22.1f}{stdlib / fast:>9.1f}x")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,99 @@
+"""Per-request cost of MetricsMiddleware and the SQL statement listeners.
+
+    python -m benchmarks.metrics_overhead [iterations]
+
+Requests are driven straight through the ASGI interface so the numbers are not
+drowned out by an HTTP client, statements run against an in-memory sqlite.
+"""
+import asyncio
+import sys
+import time
+
+from fastapi import FastAPI
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.utils import single_psql_db
+from src.utils.instrumentation import MetricsMiddleware
+
+
+def make_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def requests_per_call(app: FastAPI, iterations: int) -> float:
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": "/items/1", "raw_path": b"/items/1", "query_string": b"",
+             "root_path": "", "headers": [], "client": ("127.0.0.1", 1), "server": ("t", 80)}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(100):
+        await app(dict(scope), receive, send)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def statements_per_call(iterations: int) -> float:
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.connect() as conn:
+        for _ in range(100):
+            await conn.execute(text("SELECT 1"))
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await conn.execute(text("SELECT 1"))
+        elapsed = time.perf_counter() - start
+    await engine.dispose()
+    return elapsed / iterations * 1e6
+
+
+def set_listeners(enabled: bool):
+    for name, fn in (("before_cursor_execute", single_psql_db._start_query),
+                     ("after_cursor_execute", single_psql_db._end_query)):
+        if enabled and not event.contains(Engine, name, fn):
+            event.listen(Engine, name, fn)
+        elif not enabled and event.contains(Engine, name, fn):
+            event.remove(Engine, name, fn)
+
+
+def report(name: str, bare: float, instrumented: float):
+    print(f"{name:<10} bare {bare:8.1f} us  instrumented {instrumented:8.1f} us  "
+          f"overhead {instrumented - bare:6.1f} us ({(instrumented / bare - 1) * 100:.1f}%)")
+
+
+async def main(iterations: int, rounds: int = 5):
+    # alternate the variants and keep the best round of each to damp scheduler noise
+    apps = make_app(instrumented=False), make_app(instrumented=True)
+    bare, instrumented = [], []
+    for _ in range(rounds):
+        bare.append(await requests_per_call(apps[0], iterations))
+        instrumented.append(await requests_per_call(apps[1], iterations))
+    report("request", min(bare), min(instrumented))
+
+    single_psql_db.track_queries()
+    bare, instrumented = [], []
+    for _ in range(rounds):
+        set_listeners(False)
+        bare.append(await statements_per_call(iterations))
+        set_listeners(True)
+        instrumented.append(await statements_per_call(iterations))
+    report("statement", min(bare), min(instrumented))
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
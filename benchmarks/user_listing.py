@@ -0,0 +1,87 @@
+"""Per row cost of a GET /users page: User entities validated into UserMiniView (the previous read path)
+vs. the column projection, with and without a sparse fieldset.
+
+    python -m benchmarks.user_listing --users 5000 --page-size 1000 --repeat 30
+
+DEF_SQL_URI picks the database like benchmarks.endpoints (a throwaway sqlite file by default), the users
+table is emptied and seeded. Each iteration uses a fresh session, as a request would, and covers the
+query, building the response and rendering it to JSON; the shared cache is not involved.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.endpoints import configure, seed
+
+
+async def entities(db, pagination_data):
+    from sqlalchemy import select
+
+    from src.users.user.models import User
+    from src.users.user.schemas import UserMiniView
+    from src.users.user.service import UserService
+    from src.utils.pagination import get_pagination_info
+    from src.utils.schemas import GeneralResponse, ListView
+
+    query = select(User).execution_options(replica=True).limit(pagination_data.pageSize + 1)
+    users = (await db.scalars(query)).all()
+    has_next = len(users) > pagination_data.pageSize
+    users = users[:pagination_data.pageSize]
+    info = get_pagination_info(total_items=None, current_page=1, page_size=pagination_data.pageSize,
+                               has_next=has_next, current_page_size=len(users))
+    response = GeneralResponse(status=200, message="Users listed.",
+                               details=ListView[UserMiniView](info=info, items=users))
+    return response, UserService.list_etag(pagination_data, users, None, has_next)
+
+
+async def columns(db, pagination_data):
+    from src.users.user.service import UserService
+
+    return await UserService._query_users(db, pagination_data)
+
+
+async def measure(read, pagination_data, repeat: int):
+    from src.utils.responses import FastJSONResponse
+    from src.utils.single_psql_db import SessionLocal
+
+    timings, size = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        async with SessionLocal() as db:
+            response, _ = await read(db, pagination_data)
+            size = len(FastJSONResponse(content=response).body)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), size
+
+
+async def main(args):
+    configure(argparse.Namespace(cache=False))
+    from src.utils.schemas import PaginationGet
+    from src.utils.single_psql_db import dispose_engine, init_psql_db
+
+    await init_psql_db("create")
+    await seed(args.users)
+    page = dict(pageSize=args.page_size, count="none")
+    cases = [
+        ("entities", entities, PaginationGet(**page)),
+        ("columns", columns, PaginationGet(**page)),
+        ("columns fields=id,email", columns, PaginationGet(**page, fields="id,email")),
+    ]
+    print(f"{'read path':<26}{'ms/page':>10}{'us/row':>10}{'bytes':>10}{'speedup':>10}")
+    baseline = None
+    for name, read, pagination_data in cases:
+        await measure(read, pagination_data, 2)  # warm up the pool and the statement caches
+        seconds, size = await measure(read, pagination_data, args.repeat)
+        baseline = baseline or seconds
+        print(f"{name:<26}{seconds * 1000:>10.2f}{seconds / args.page_size * 1e6:>10.2f}{size:>10}"
+              f"{baseline / seconds:>9.1f}x")
+    await dispose_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=30)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,103 @@
+"""GET /users search latency with and without the pg_trgm indexes.
+
+Needs a postgres database, DEF_SQL_URI points at it:
+
+    python -m benchmarks.user_search --users 1000000 --repeat 20
+
+Missing users are seeded with generate_series, the trigram indexes are dropped
+inside a transaction that is rolled back for the "without indexes" run. The
+benchmark installs pg_trgm itself; where the server does not ship it only the
+sequential ILIKE scan (the like backend) is measured.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import text
+
+from sqlalchemy.exc import DBAPIError
+
+from src.settings import config
+from src.users.user.models import User
+from src.users.user.service import UserService
+from src.utils.schemas import PaginationGet
+from src.utils.single_psql_db import SessionLocal, engine, init_psql_db
+
+TERMS = ["ali", "smith", "user4242", "example.com", "zzzq"]
+TRGM_INDEXES = ["ix_users_first_name_trgm", "ix_users_last_name_trgm", "ix_users_email_trgm"]
+
+SEED = text("""
+INSERT INTO users (id, email, first_name, last_name, password, is_active, is_superuser, created_at, updated_at)
+SELECT gen_random_uuid(),
+       'user' || i || '@example.com',
+       (ARRAY['ali', 'ayse', 'mehmet', 'john', 'jane', 'maria'])[1 + i % 6] || substr(md5(i::text), 1, 6),
+       (ARRAY['smith', 'yilmaz', 'kaya', 'doe', 'garcia'])[1 + i % 5] || substr(md5((i * 7)::text), 1, 6),
+       'x', true, false, now(), now() - (i || ' seconds')::interval
+FROM generate_series(CAST(:start AS integer), CAST(:stop AS integer)) AS i
+""")
+
+
+async def seed(users: int):
+    async with SessionLocal() as db:
+        existing = await User.get_count(db)
+        for start in range(existing, users, 100_000):
+            await db.execute(SEED, {"start": start, "stop": min(start + 100_000, users) - 1})
+            await db.commit()
+            print(f"seeded {min(start + 100_000, users):,} users")
+        await db.execute(text("ANALYZE users"))
+        await db.commit()
+
+
+async def measure(db, term: str, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await UserService._query_users(db=db, pagination_data=PaginationGet(search=term))
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[max(0, int(len(timings) * 0.95) - 1)]
+
+
+async def install_pg_trgm() -> bool:
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        return True
+    except DBAPIError as e:
+        print(f"pg_trgm is not available ({e.orig}), measuring the like backend only")
+        return False
+
+
+async def main(users: int, repeat: int):
+    has_trgm = await install_pg_trgm()
+    await init_psql_db("create")  # creates the trigram indexes once the extension exists
+    await seed(users)
+    if not has_trgm:
+        config.SEARCH_BACKEND = "like"
+        print(f"{'term':<14}{'seq p50':>12}{'seq p95':>12}  (ms)")
+        for term in TERMS:
+            async with SessionLocal() as db:
+                p50, p95 = await measure(db, term, repeat)
+            print(f"{term:<14}{p50:>12.1f}{p95:>12.1f}")
+        await engine.dispose()
+        return
+    print(f"{'term':<14}{'trgm p50':>12}{'trgm p95':>12}{'seq p50':>12}{'seq p95':>12}  (ms)")
+    for term in TERMS:
+        async with SessionLocal() as db:
+            with_index = await measure(db, term, repeat)
+        async with SessionLocal() as db:
+            for index in TRGM_INDEXES:
+                await db.execute(text(f"DROP INDEX IF EXISTS {index}"))
+            without_index = await measure(db, term, repeat)
+            await db.rollback()
+        print(f"{term:<14}{with_index[0]:>12.1f}{with_index[1]:>12.1f}{without_index[0]:>12.1f}{without_index[1]:>12.1f}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.repeat))
@@ -0,0 +1,121 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import Column, ForeignKey, Table, select, insert, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from uuid import UUID, uuid4
+from typing import FrozenSet, Iterable, Optional
+
+from src.users.user.models import User
+from src.utils.single_psql_db import Base, commit
+
+role_permissions = Table(
+    "role_permissions",
+    Base.metadata,
+    Column("role_id", ForeignKey("roles.id", ondelete="CASCADE"), primary_key=True),
+    Column("permission_id", ForeignKey("permissions.id", ondelete="CASCADE"), primary_key=True),
+)
+
+user_roles = Table(
+    "user_roles",
+    Base.metadata,
+    Column("user_id", ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+    Column("role_id", ForeignKey("roles.id", ondelete="CASCADE"), primary_key=True, index=True),
+)
+
+
+class Permission(Base):
+    """A permission code such as `user.create`, `user.*` or `*`."""
+    __tablename__ = "permissions"
+    id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
+    code: Mapped[str] = mapped_column(nullable=False, unique=True, index=True)
+    description: Mapped[Optional[str]] = mapped_column(nullable=True)
+
+    @classmethod
+    async def ensure(cls, db: AsyncSession, codes: Iterable[str]) -> list:
+        codes = set(codes)
+        existing = (await db.scalars(select(cls).where(cls.code.in_(codes)))).all()
+        missing = codes - {permission.code for permission in existing}
+        created = [cls(code=code) for code in sorted(missing)]
+        db.add_all(created)
+        return [*existing, *created]
+
+
+class Role(Base):
+    __tablename__ = "roles"
+    id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
+    name: Mapped[str] = mapped_column(nullable=False, unique=True, index=True)
+    description: Mapped[Optional[str]] = mapped_column(nullable=True)
+
+    @classmethod
+    async def by_name(cls, db: AsyncSession, name: str) -> "Role":
+        return await db.scalar(select(cls).where(cls.name == name))
+
+    @classmethod
+    async def ensure(cls, db: AsyncSession, name: str, codes: Iterable[str]) -> "Role":
+        """Creates the role if needed and grants it `codes`, existing grants are kept."""
+        role = await cls.by_name(db, name)
+        if role is None:
+            role = cls(name=name)
+            db.add(role)
+        permissions = await Permission.ensure(db, codes)
+        await db.flush()
+        granted = set((await db.scalars(
+            select(role_permissions.c.permission_id).where(role_permissions.c.role_id == role.id)
+        )).all())
+        rows = [{"role_id": role.id, "permission_id": permission.id}
+                for permission in permissions if permission.id not in granted]
+        if rows:
+            await db.execute(insert(role_permissions), rows)
+            await User.bump_permissions_version(db, User.id.in_(cls._members(role.id)))
+        await commit(db)
+        return role
+
+    @classmethod
+    async def revoke(cls, db: AsyncSession, name: str, codes: Iterable[str]):
+        """Takes `codes` away from the role, tokens of its members stop working."""
+        role = await cls.by_name(db, name)
+        if role is None:
+            return
+        result = await db.execute(delete(role_permissions).where(
+            role_permissions.c.role_id == role.id,
+            role_permissions.c.permission_id.in_(select(Permission.id).where(Permission.code.in_(set(codes)))),
+        ))
+        if result.rowcount:
+            await User.bump_permissions_version(db, User.id.in_(cls._members(role.id)))
+        await commit(db)
+
+    @classmethod
+    async def assign(cls, db: AsyncSession, user_id: UUID, role_id: UUID):
+        """Gives the user the role, effective from the user's next login: the current token stops working."""
+        exists = await db.scalar(select(user_roles.c.user_id).where(
+            user_roles.c.user_id == user_id, user_roles.c.role_id == role_id))
+        if exists is None:
+            await db.execute(insert(user_roles).values(user_id=user_id, role_id=role_id))
+            await User.bump_permissions_version(db, User.id == user_id)
+            await commit(db)
+
+    @classmethod
+    async def unassign(cls, db: AsyncSession, user_id: UUID, role_id: UUID):
+        """Takes the role away, the user's current token stops working."""
+        result = await db.execute(delete(user_roles).where(
+            user_roles.c.user_id == user_id, user_roles.c.role_id == role_id))
+        if result.rowcount:
+            await User.bump_permissions_version(db, User.id == user_id)
+            await commit(db)
+
+    @staticmethod
+    def _members(role_id: UUID):
+        return select(user_roles.c.user_id).where(user_roles.c.role_id == role_id)
+
+    @staticmethod
+    async def permissions_of(db: AsyncSession, user_id: UUID) -> FrozenSet[str]:
+        """Every permission code granted to the user through any role, in one query."""
+        stmt = (
+            select(Permission.code)
+            .join(role_permissions, role_permissions.c.permission_id == Permission.id)
+            .join(user_roles, user_roles.c.role_id == role_permissions.c.role_id)
+            .where(user_roles.c.user_id == user_id)
+            .distinct()
+            .execution_options(replica=True)
+        )
+        return frozenset((await db.scalars(stmt)).all())
@@ -1,6 +1,44 @@
-def has_access():
-    return None
+from functools import lru_cache
+from typing import FrozenSet, Iterable, Tuple
 
+from sqlalchemy.ext.asyncio import AsyncSession
 
-def need_access():
-    return None
+from src.auth.access.models import Role
+from src.utils.exceptions import AccessError
+
+__all__ = ["ALL", "compile_permissions", "has_access", "need_access"]
+
+ALL = "*"
+
+
+@lru_cache(maxsize=1024)
+def _grants_for(required: Tuple[str, ...]) -> FrozenSet[str]:
+    """Every granted code that satisfies one of `required`: the code itself, its `prefix.*`
+    wildcards and `*`. "user.create" -> {"user.create", "user.*", "*"}."""
+    grants = {ALL}
+    for code in required:
+        grants.add(code)
+        parts = code.split(".")
+        for end in range(1, len(parts)):
+            grants.add(".".join(parts[:end]) + ".*")
+    return frozenset(grants)
+
+
+async def compile_permissions(db: AsyncSession, user) -> FrozenSet[str]:
+    """The user's permission set as embedded in the access token, superusers get `*`."""
+    if user.is_superuser:
+        return frozenset({ALL})
+    return await Role.permissions_of(db, user.id)
+
+
+def has_access(actor, required: Iterable[str]) -> bool:
+    """True when the actor holds any of `required`, directly or through a wildcard.
+
+    `actor.permissions` is compiled at login, so this is a set intersection, no query.
+    """
+    return not actor.permissions.isdisjoint(_grants_for(tuple(required)))
+
+
+def need_access(actor, required: Iterable[str]):
+    if not has_access(actor, required):
+        raise AccessError()
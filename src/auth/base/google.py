@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Dict, Optional
+
+from jose import JWTError, jwt
+
+from src.settings import config
+from src.utils.exceptions import AuthError, ServiceUnavailableError
+from src.utils.http_client import http_client
+
+__all__ = ["JWKSCache", "google_jwks", "exchange_code", "verify_id_token"]
+
+logger = logging.getLogger("src.auth")
+
+MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class JWKSCache:
+    """Signing keys of an OpenID provider, fetched on first use and then refreshed in the background
+    shortly before they expire, so verifying an ID token does not wait on the network."""
+
+    def __init__(self, url: str, refresh_interval: float, min_refresh_interval: float):
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.keys: Dict[str, dict] = {}
+        self.expires_at = 0.0
+        self.fetched_at = 0.0
+        self._lock = asyncio.Lock()
+        self._refresher: Optional[asyncio.Task] = None
+
+    async def refresh(self, older_than: Optional[float] = None):
+        """Fetches the keys, callers that queued behind a concurrent fetch reuse its result."""
+        async with self._lock:
+            if older_than is not None and self.fetched_at > older_than:
+                return
+            resp = await http_client.get(self.url)
+            resp.raise_for_status()
+            self.keys = {key["kid"]: key for key in resp.json()["keys"]}
+            ttl = self.refresh_interval
+            max_age = MAX_AGE.search(resp.headers.get("cache-control", ""))
+            if max_age:
+                ttl = min(ttl, int(max_age.group(1)))
+            self.fetched_at = time.monotonic()
+            self.expires_at = self.fetched_at + ttl
+
+    async def get(self, kid: str) -> Optional[dict]:
+        import httpx
+
+        now = time.monotonic()
+        stale = now >= self.expires_at
+        # an unknown kid means the provider rotated early, refetch but never more often than min_refresh_interval
+        if stale or (kid not in self.keys and now - self.fetched_at >= self.min_refresh_interval):
+            try:
+                await self.refresh(older_than=now)
+            except (httpx.HTTPError, KeyError, ValueError):
+                logger.exception("fetching %s failed", self.url)
+                if not self.keys:
+                    raise ServiceUnavailableError()
+                # keep serving the old keys for a while instead of refetching on every login
+                self.fetched_at = now
+                self.expires_at = now + self.min_refresh_interval
+            self.start_refresh()
+        return self.keys.get(kid)
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(max(self.min_refresh_interval, (self.expires_at - time.monotonic()) * 0.9))
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("refreshing %s failed", self.url)
+
+    def start_refresh(self):
+        """Keeps the keys fresh from now on, started by the first lookup so idle processes make no calls."""
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+
+
+google_jwks = JWKSCache(config.GOOGLE_JWKS_URL, config.GOOGLE_JWKS_REFRESH_INTERVAL,
+                        config.GOOGLE_JWKS_MIN_REFRESH_INTERVAL)
+
+
+async def exchange_code(code: str) -> dict:
+    import httpx
+
+    try:
+        resp = await http_client.post(config.GOOGLE_TOKEN_URL, data={
+            "code": code,
+            "client_id": config.GOOGLE_CLIENT_ID,
+            "client_secret": config.GOOGLE_CLIENT_SECRET,
+            "redirect_uri": config.GOOGLE_REDIRECT_URI,
+            "grant_type": "authorization_code",
+        })
+    except httpx.HTTPError:
+        # Google unreachable or too slow, not a bad code
+        logger.exception("exchanging the code at %s failed", config.GOOGLE_TOKEN_URL)
+        raise ServiceUnavailableError()
+    if resp.status_code != 200:
+        raise AuthError("Google login failed")
+    try:
+        return resp.json()
+    except ValueError:
+        raise AuthError("Google login failed")
+
+
+async def verify_id_token(id_token: str) -> dict:
+    """Claims of a Google ID token, checked locally: signature, audience, issuer, expiry and a verified email."""
+    try:
+        kid = jwt.get_unverified_header(id_token).get("kid")
+    except JWTError:
+        raise AuthError("Google login failed")
+    key = await google_jwks.get(kid) if kid else None
+    if key is None:
+        raise AuthError("Google login failed")
+    try:
+        # at_hash would need the access token, which is not used for anything here
+        claims = jwt.decode(id_token, key, algorithms=[key.get("alg", "RS256")], audience=config.GOOGLE_CLIENT_ID,
+                            options={"verify_at_hash": False})
+    except JWTError:
+        raise AuthError("Google login failed")
+    if claims.get("iss") not in config.GOOGLE_ISSUERS:
+        raise AuthError("Google login failed")
+    # the login is linked to an existing account by email, only an address Google verified may do that
+    if not claims.get("email") or claims.get("email_verified") is not True:
+        raise AuthError("Google login failed")
+    return claims
@@ -0,0 +1,28 @@
+from src.jobs.job.service import job_handler
+from src.utils.mailer import send_mail
+
+from src.settings import config
+
+__all__ = ["SEND_WELCOME_MAIL", "SEND_PASSWORD_RESET_MAIL"]
+
+SEND_WELCOME_MAIL = "auth.send_welcome_mail"
+SEND_PASSWORD_RESET_MAIL = "auth.send_password_reset_mail"
+
+
+@job_handler(SEND_WELCOME_MAIL)
+async def send_welcome_mail(payload: dict):
+    await send_mail(payload["email"], "Hoş geldiniz",
+                    f"Merhaba {payload['first_name']},\n\nHesabınız oluşturuldu.")
+
+
+@job_handler(SEND_PASSWORD_RESET_MAIL)
+async def send_password_reset_mail(payload: dict):
+    from src.auth.base.service import AuthService  # the service module enqueues these jobs
+
+    token = await AuthService.password_reset_token(payload["email"])
+    if token is None:  # no active account, nothing is sent
+        return
+    link = config.PASSWORD_RESET_URL.format(token=token)
+    await send_mail(payload["email"], "Şifre sıfırlama",
+                    f"Şifrenizi sıfırlamak için {config.PASSWORD_RESET_EXPIRE_MINUTES} dakika içinde "
+                    f"bağlantıya tıklayın:\n\n{link}\n\nBu isteği siz yapmadıysanız bu e-postayı yok sayın.")
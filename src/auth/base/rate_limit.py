@@ -0,0 +1,12 @@
+from src.settings import config
+from src.utils.rate_limit import RateLimiter, rate_limit_backend
+
+__all__ = ["sign_in_limiter", "sign_up_limiter", "forgot_password_limiter"]
+
+# sign-in is keyed by ip and by identifier, so a botnet spraying one account is throttled too
+sign_in_limiter = RateLimiter("sign-in", rate_limit_backend, per_ip=config.SIGN_IN_IP_RATE_LIMIT,
+                              per_key=config.SIGN_IN_IDENTIFIER_RATE_LIMIT)
+sign_up_limiter = RateLimiter("sign-up", rate_limit_backend, per_ip=config.SIGN_UP_IP_RATE_LIMIT)
+forgot_password_limiter = RateLimiter("forgot-password", rate_limit_backend,
+                                      per_ip=config.FORGOT_PASSWORD_IP_RATE_LIMIT,
+                                      per_key=config.FORGOT_PASSWORD_EMAIL_RATE_LIMIT)
@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, Request
+from src.utils.responses import FastJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.auth.base.schemas import LoginSchema, RegisterSchema
+from src.auth.base.schemas import LoginSchema, RegisterSchema, ForgotPasswordSchema, ResetPasswordSchema
 from src.users.user.models import User
-from src.users.user.schemas import UserMeView
+from src.users.user.schemas import UserMeView, UserSnapshot
 from src.auth.base.service import AuthService
+from src.auth.base.rate_limit import sign_in_limiter, sign_up_limiter, forgot_password_limiter
+from src.utils.exceptions import NotFoundError
 from src.auth.current_user import get_current_user
+from src.utils.single_psql_db import get_session
+from src.utils.query_detector import query_budget
 
 from src.settings import config
 
@@ -16,41 +21,50 @@ auth = APIRouter(
 )
 
 
-@auth.post("/sign-in")
-async def login(loginSchema: LoginSchema):
-    content = await AuthService.login(loginSchema)
-    resp = JSONResponse(status_code=content.status, content=content.model_dump())
+@auth.post("/sign-in", dependencies=[Depends(query_budget(2))])
+async def login(request: Request, loginSchema: LoginSchema, db: AsyncSession = Depends(get_session)):
+    await sign_in_limiter.check(request, loginSchema.identifier)
+    content = await AuthService.login(db, loginSchema)
+    await sign_in_limiter.reset(loginSchema.identifier)
+    resp = FastJSONResponse(status_code=content.status, content=content)
     resp.set_cookie("Authorization", value=content.details, max_age=60*config.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
     return resp
 
-@auth.post("/sign-up")
-async def register(registerSchema: RegisterSchema):
-    content = await AuthService.register(registerSchema)
-    resp = JSONResponse(status_code=content.status, content=content.model_dump())
+@auth.post("/sign-up", dependencies=[Depends(query_budget(3))])
+async def register(request: Request, registerSchema: RegisterSchema, db: AsyncSession = Depends(get_session)):
+    await sign_up_limiter.check(request)
+    content = await AuthService.register(db, registerSchema)
+    resp = FastJSONResponse(status_code=content.status, content=content)
     resp.set_cookie("Authorization", value=content.details, max_age=60*config.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
     return resp
 
 @auth.post("/sign-out")
 async def logout():
-    resp = JSONResponse(status_code=200, content={"message": "Başarıyla Çıkış Yapıldı."})
+    resp = FastJSONResponse(status_code=200, content={"message": "Başarıyla Çıkış Yapıldı."})
     resp.delete_cookie("Authorization")
     return resp
 
-@auth.get("me")
-async def me(current_user: User = Depends(get_current_user)):
-    return JSONResponse(status_code=200, content=UserMeView.model_validate(current_user).model_dump())
+@auth.get("/me", dependencies=[Depends(query_budget(2))])
+async def me(current_user: UserSnapshot = Depends(get_current_user), db: AsyncSession = Depends(get_session)):
+    user = await User.by_id(db, current_user.id)
+    if user is None:
+        raise NotFoundError("User not found")
+    return FastJSONResponse(status_code=200, content=UserMeView.model_validate(user))
 
-@auth.post("/forgot-password")
-async def forgot_password():
-    pass
+@auth.post("/forgot-password", dependencies=[Depends(query_budget(2))])
+async def forgot_password(request: Request, schema: ForgotPasswordSchema, db: AsyncSession = Depends(get_session)):
+    await forgot_password_limiter.check(request, schema.email)
+    content = await AuthService.forgot_password(db, schema)
+    return FastJSONResponse(status_code=content.status, content=content)
 
-@auth.post("/reset-password")
-async def reset_password():
-    pass
+@auth.post("/reset-password", dependencies=[Depends(query_budget(2))])
+async def reset_password(schema: ResetPasswordSchema, db: AsyncSession = Depends(get_session)):
+    content = await AuthService.reset_password(db, schema)
+    return FastJSONResponse(status_code=content.status, content=content)
 
 @auth.post("/oauth2/google")
-async def google_login(credentials: str):
-    content = await AuthService.google_login(credentials)
-    resp = JSONResponse(status_code=content.status, content=content.model_dump())
+async def google_login(credentials: str, db: AsyncSession = Depends(get_session)):
+    content = await AuthService.google_login(db, credentials)
+    resp = FastJSONResponse(status_code=content.status, content=content)
     resp.set_cookie("Authorization", value=content.details, max_age=60*config.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
     return resp
@@ -24,3 +24,20 @@ class RegisterSchema(BaseModel):
         if "password" in values.data and v != values.data["password"].get_secret_value():
             raise ValueError("passwords don't match")
         return v
+
+class ForgotPasswordSchema(BaseModel):
+    email: EmailStr = Field(..., min_length=3, max_length=50)
+
+    class Config:
+        str_strip_whitespace = True
+
+class ResetPasswordSchema(BaseModel):
+    token: str
+    password: SecretStr
+    password_repeat: SecretStr
+
+    @field_validator("password_repeat", mode="before")
+    def password_match(cls, v, values, **kwargs):
+        if "password" in values.data and v != values.data["password"].get_secret_value():
+            raise ValueError("passwords don't match")
+        return v
@@ -1,50 +1,67 @@
-import httpx
+import hashlib
+import hmac
+import secrets
 
-from src.auth.base.schemas import RegisterSchema, LoginSchema
+from src.auth.base.schemas import RegisterSchema, LoginSchema, ForgotPasswordSchema, ResetPasswordSchema
+from src.auth.base.google import exchange_code, verify_id_token
+from src.auth.base.jobs import SEND_WELCOME_MAIL, SEND_PASSWORD_RESET_MAIL
+from src.jobs.job.service import enqueue
 
 from src.utils.schemas import GeneralResponse
 from src.utils.exceptions import AuthError, NotFoundError
 
-from src.users.user.schemas import UserCreate
+from src.users.user.schemas import UserCreate, UserUpdate
 from src.users.user.models import User
+from src.auth.access.service import compile_permissions
 
 from src.settings import config
 
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from datetime import datetime, timedelta
-from jose import jwt
-from passlib.context import CryptContext
-from passlib import pwd
+from jose import JWTError, jwt
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from src.utils.password_hasher import password_hasher
+from src.utils.single_psql_db import atomic, get_db
 
-def hash_password(password):
-    return pwd_context.hash(password)
+async def hash_password(password):
+    return await password_hasher.hash(password)
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await password_hasher.verify(plain_password, hashed_password)
 
 class AuthService:
 
     @staticmethod
-    async def register(register_schema: RegisterSchema):
+    async def register(db: AsyncSession, register_schema: RegisterSchema):
         new_user = UserCreate(**register_schema.model_dump())
-        user = await User.create(new_user)
-        access_token = AuthService.create_access_token(
-            data={"sub": user.email}, expires_delta=config.JWT_ACCESS_TOKEN_EXPIRE_MINUTES
-        )
+        async with atomic(db):
+            user = await User.create(db, new_user)
+            await enqueue(db, SEND_WELCOME_MAIL, {"email": user.email, "first_name": user.first_name})
+        access_token = await AuthService.issue_access_token(db, user)
         return GeneralResponse(status=201, message="Registered successfully", details=access_token)
 
     @staticmethod
-    async def authenticate(identifier: str, password: str):
-        user = await User.by_email(identifier)
+    async def authenticate(db: AsyncSession, identifier: str, password: str):
+        user = await User.by_email(db, identifier)
         if not user:
             raise NotFoundError("User not found")
         if user.is_active is False:
             raise AuthError("User is not active")
-        if not verify_password(password, user.password):
+        if not await verify_password(password, user.password):
             raise AuthError("Password is not correct")
         return user
 
+    @staticmethod
+    async def issue_access_token(db: AsyncSession, user: User) -> str:
+        # permissions are compiled once here, need_access then never queries; a role change bumps
+        # permissions_version, which revokes the token (get_current_user) and the next login compiles again
+        permissions = await compile_permissions(db, user)
+        return AuthService.create_access_token(
+            data={"sub": user.email, "perms": sorted(permissions), "pv": user.permissions_version},
+            expires_delta=config.JWT_ACCESS_TOKEN_EXPIRE_MINUTES
+        )
+
     @staticmethod
     def create_access_token(data: dict, expires_delta: int):
         to_encode = data.copy()
@@ -54,45 +71,67 @@ class AuthService:
         return encoded_jwt
 
     @staticmethod
-    async def login(login_schema: LoginSchema):
-        user = await AuthService.authenticate(identifier=login_schema.identifier, password=login_schema.password.get_secret_value())
-        access_token = AuthService.create_access_token(
-            data={"sub": user.email}, expires_delta=config.JWT_ACCESS_TOKEN_EXPIRE_MINUTES
+    def password_fingerprint(user: User) -> str:
+        # changes with every password change, so a reset token works once and dies with the old password;
+        # keyed, so the token doesn't carry a plain digest of the password hash
+        return hmac.new(config.JWT_SECRET_KEY.encode(), user.password.encode(), hashlib.sha256).hexdigest()[:16]
+
+    @staticmethod
+    async def password_reset_token(email: str):
+        """A reset token for the account of `email`, None when there is no active one. Runs in the mail job."""
+        async with get_db() as db:
+            user = await User.by_email(db, email)
+        if user is None or not user.is_active:
+            return None
+        return AuthService.create_access_token(
+            data={"sub": user.email, "purpose": "password_reset", "fp": AuthService.password_fingerprint(user)},
+            expires_delta=config.PASSWORD_RESET_EXPIRE_MINUTES,
         )
+
+    @staticmethod
+    async def forgot_password(db: AsyncSession, schema: ForgotPasswordSchema):
+        # the account is looked up by the job, so the request does the same work (and takes as long)
+        # whether or not the address exists
+        await enqueue(db, SEND_PASSWORD_RESET_MAIL, {"email": schema.email})
+        return GeneralResponse(status=200, message="If the address is registered a reset mail has been sent")
+
+    @staticmethod
+    async def reset_password(db: AsyncSession, schema: ResetPasswordSchema):
+        try:
+            payload = jwt.decode(schema.token, config.JWT_SECRET_KEY, algorithms=[config.JWT_ALGORITHM])
+        except JWTError:
+            raise AuthError("token.not.valid")
+        if payload.get("purpose") != "password_reset" or payload.get("sub") is None:
+            raise AuthError("token.not.valid")
+        user = await User.by_email(db, payload["sub"])
+        if user is None or not user.is_active or payload.get("fp") != AuthService.password_fingerprint(user):
+            raise AuthError("token.not.valid")
+        await User.update(db, user.id, UserUpdate(password=schema.password))
+        return GeneralResponse(status=200, message="Password has been reset")
+
+    @staticmethod
+    async def login(db: AsyncSession, login_schema: LoginSchema):
+        user = await AuthService.authenticate(db, identifier=login_schema.identifier, password=login_schema.password.get_secret_value())
+        access_token = await AuthService.issue_access_token(db, user)
         return GeneralResponse(status=200, message="Logged in successfully", details=access_token)
 
     @staticmethod
-    async def google_login(credentials: str):
-        # @TODO Google login
-        async with httpx.AsyncClient() as client:
-            resp = await client.post("https://oauth2.googleapis.com/token", data={
-                "code": credentials,
-                "client_id": config.GOOGLE_CLIENT_ID,
-                "client_secret": config.GOOGLE_CLIENT_SECRET,
-                "redirect_uri": config.GOOGLE_REDIRECT_URI,
-                "grant_type": "authorization_code",
-            })
-            if resp.status_code != 200:
-                raise AuthError("Google login failed")
-            resp_json = resp.json()
-            resp = await client.get("https://www.googleapis.com/oauth2/v1/userinfo", headers={
-                "Authorization": f"Bearer {resp_json['access_token']}"
-            })
-            if resp.status_code != 200:
-                raise AuthError("Google login failed")
-            resp_json = resp.json()
-            user = await User.by_email(User.email == resp_json["email"])
-            print("user bu", user)
-            if user is None:
-                user = User.create(
-                    UserCreate(
-                        email=resp_json["email"],
-                        password=pwd.genword(length=24, charset="ascii_50"),
-                        first_name=resp_json["given_name"],
-                        last_name=resp_json["family_name"],
-                    )
+    async def google_login(db: AsyncSession, credentials: str):
+        # the ID token of the code exchange is verified against cached keys, no userinfo round-trip
+        tokens = await exchange_code(credentials)
+        if "id_token" not in tokens:
+            raise AuthError("Google login failed")
+        claims = await verify_id_token(tokens["id_token"])
+        user = await User.by_email(db, claims["email"])
+        if user is None:
+            user = await User.create(
+                db,
+                UserCreate(
+                    email=claims["email"],
+                    password=secrets.token_urlsafe(24),
+                    first_name=claims.get("given_name") or claims["email"].split("@")[0],
+                    last_name=claims.get("family_name") or "",
                 )
-            access_token = AuthService.create_access_token(
-                data={"sub": user.email}, expires_delta=config.JWT_ACCESS_TOKEN_EXPIRE_MINUTES
             )
-            return GeneralResponse(status=200, message="Logged in successfully", details=access_token)
+        access_token = await AuthService.issue_access_token(db, user)
+        return GeneralResponse(status=200, message="Logged in successfully", details=access_token)
@@ -1,30 +1,60 @@
+import hashlib
+import time
+
 from src.utils.exceptions import AuthError
-from fastapi import Cookie, Request
+from src.utils.cache import TTLCache
+from fastapi import Cookie, Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.settings import config
 from src.users.user.models import User
+from src.users.user.schemas import UserSnapshot
+from src.users.user.cache import cached_user, remember_user
+from src.utils.single_psql_db import get_session
 
 from datetime import datetime
 
 from jose import JWTError, jwt
 from pydantic import ValidationError
 
-async def get_current_user(Authorization: str = Cookie(None)) -> User:
-    if Authorization is None:
-        raise AuthError("Token yok.")
-    token = Authorization  # @TODO -> gzip zamanı buraya ekleme yaparsın.
+# sha256(token) -> verified claims, each entry lives until the token's own exp
+decoded_token_cache = TTLCache(maxsize=config.JWT_DECODE_CACHE_SIZE, ttl=0)
+
+def decode_access_token(token: str) -> dict:
+    key = hashlib.sha256(token.encode()).digest()
+    payload = decoded_token_cache.get(key)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, config.JWT_SECRET_KEY, algorithms=[config.JWT_ALGORITHM])
-        email: str = payload.get("sub")
         expired_at: int = payload.get("exp")
         if datetime.fromtimestamp(expired_at) < datetime.now():
             raise AuthError("token.not.valid")
-        if email is None:
+        if payload.get("sub") is None:
+            raise AuthError("token.not.valid")
+        if payload.get("purpose") is not None:  # e.g. a password reset token, never a session
             raise AuthError("token.not.valid")
-    except (JWTError, ValidationError):
+        payload["perms"] = frozenset(payload.get("perms") or ())
+    except (JWTError, ValidationError, TypeError):
         raise AuthError("token.not.valid")
-    user = await User.by_email(email)
+    decoded_token_cache.set(key, payload, ttl=expired_at - time.time())
+    return payload
+
+async def get_current_user(Authorization: str = Cookie(None), db: AsyncSession = Depends(get_session)) -> UserSnapshot:
+    if Authorization is None:
+        raise AuthError("Token yok.")
+    payload = decode_access_token(Authorization)
+    email: str = payload["sub"]
+    user = cached_user(email)
     if user is None:
-        raise AuthError("token.not.valid")
+        # on the request's session, a loader batch would check out a second connection
+        user = await User.by_email(db, email)
+        if user is None:
+            raise AuthError("token.not.valid")
+        user = UserSnapshot.model_validate(user)
+        remember_user(email, user)
     if user.is_active is False:
         raise AuthError("token.not.valid")
-    return user
+    # the token's permissions were compiled before the user's roles last changed
+    if payload.get("pv", 0) != user.permissions_version:
+        raise AuthError("token.not.valid")
+    return user.model_copy(update={"permissions": payload["perms"]})
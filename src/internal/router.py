@@ -0,0 +1,91 @@
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header
+from fastapi.responses import PlainTextResponse
+from src.utils.responses import FastJSONResponse
+from src.utils.metrics import registry
+
+from src.utils.single_psql_db import pool_stats
+from src.utils.password_hasher import password_hasher
+from src.utils.schemas import GeneralResponse
+from src.users.user.cache import current_user_cache
+from src.utils.cache import shared_cache
+from src.auth.current_user import decoded_token_cache
+from src.utils.http_client import http_client
+from src.auth.base.google import google_jwks
+from src.utils.startup import startup_report
+from src.users.user.loaders import user_by_id
+from src.utils.exceptions import AuthError, NotFoundError
+from src.settings import config
+
+
+def require_internal_token(authorization: Optional[str] = Header(None)):
+    """Operational endpoints answer only to `Authorization: Bearer <INTERNAL_TOKEN>`, and look absent
+    while no token is configured."""
+    if not config.INTERNAL_TOKEN:
+        raise NotFoundError()
+    scheme, _, credentials = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(credentials.encode(), config.INTERNAL_TOKEN.encode()):
+        raise AuthError(headers={"WWW-Authenticate": "Bearer"})
+
+
+# operational endpoints, for the cluster's own tooling
+internal = APIRouter(
+    prefix="/internal",
+    tags=["internal"],
+    include_in_schema=False,
+    dependencies=[Depends(require_internal_token)],
+)
+
+# scraped by prometheus at the conventional path, outside the /internal prefix; give the scrape job
+# `authorization: {credentials: <INTERNAL_TOKEN>}`
+metrics = APIRouter(
+    tags=["internal"],
+    include_in_schema=False,
+    dependencies=[Depends(require_internal_token)],
+)
+
+
+@internal.get("/db-pool")
+async def db_pool():
+    content = GeneralResponse(status=200, message="DB pool stats.", details=pool_stats())
+    return FastJSONResponse(status_code=content.status, content=content)
+
+@internal.get("/password-hasher")
+async def password_hasher_stats():
+    content = GeneralResponse(status=200, message="Password hasher stats.", details=password_hasher.stats())
+    return FastJSONResponse(status_code=content.status, content=content)
+
+@internal.get("/caches")
+async def caches():
+    content = GeneralResponse(status=200, message="Cache stats.", details={
+        "current_user": current_user_cache.stats(),
+        "decoded_token": decoded_token_cache.stats(),
+        "shared": shared_cache.stats(),
+    })
+    return FastJSONResponse(status_code=content.status, content=content)
+
+@internal.get("/http-client")
+async def http_client_stats():
+    content = GeneralResponse(status=200, message="Outbound HTTP client stats.", details={
+        **http_client.stats(),
+        "google_jwks_keys": sorted(google_jwks.keys),
+    })
+    return FastJSONResponse(status_code=content.status, content=content)
+
+@internal.get("/startup")
+async def startup_stats():
+    content = GeneralResponse(status=200, message="Startup timings in seconds.", details=startup_report.stats())
+    return FastJSONResponse(status_code=content.status, content=content)
+
+@internal.get("/loaders")
+async def loaders():
+    content = GeneralResponse(status=200, message="Batch loader stats.", details={
+        "user_by_id": user_by_id.stats(),
+    })
+    return FastJSONResponse(status_code=content.status, content=content)
+
+@metrics.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
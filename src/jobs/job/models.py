@@ -0,0 +1,73 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import JSON, Index, and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+from typing import List, Optional
+
+from src.utils.single_psql_db import Base, commit
+
+class Job(Base):
+    """A unit of background work, persisted so it survives restarts until a worker completes it."""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+    id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
+    name: Mapped[str] = mapped_column(nullable=False)
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+    status: Mapped[str] = mapped_column(nullable=False, default="queued")  # queued | running | done | failed
+    attempts: Mapped[int] = mapped_column(nullable=False, default=0)
+    max_attempts: Mapped[int] = mapped_column(nullable=False)
+    run_at: Mapped[datetime] = mapped_column(nullable=False, default=datetime.utcnow)
+    locked_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+    locked_by: Mapped[Optional[str]] = mapped_column(nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(nullable=True)
+
+    @classmethod
+    async def enqueue(cls, db: AsyncSession, name: str, payload: dict, max_attempts: int,
+                      delay: float = 0) -> "Job":
+        job = await cls.insert_returning(db, dict(
+            name=name, payload=payload, max_attempts=max_attempts,
+            run_at=datetime.utcnow() + timedelta(seconds=delay),
+        ))
+        await commit(db)
+        return job
+
+    @classmethod
+    async def claim(cls, db: AsyncSession, worker: str, limit: int, lock_timeout: float) -> List["Job"]:
+        """Marks up to `limit` due jobs as running for `worker` in one statement.
+
+        On postgres FOR UPDATE SKIP LOCKED lets several workers claim concurrently, jobs left
+        running by a crashed worker become due again after `lock_timeout`.
+        """
+        now = datetime.utcnow()
+        due = or_(
+            and_(cls.status == "queued", cls.run_at <= now),
+            and_(cls.status == "running", cls.locked_at < now - timedelta(seconds=lock_timeout)),
+        )
+        ids = (select(cls.id).where(due).order_by(cls.run_at).limit(limit)
+               .with_for_update(skip_locked=True).scalar_subquery())
+        stmt = (update(cls).where(cls.id.in_(ids))
+                .values(status="running", locked_at=now, locked_by=worker, attempts=cls.attempts + 1)
+                .returning(cls).execution_options(synchronize_session=False))
+        jobs = (await db.scalars(stmt)).all()
+        await db.commit()
+        return list(jobs)
+
+    @classmethod
+    async def finish(cls, db: AsyncSession, job_id: UUID):
+        await db.execute(update(cls).where(cls.id == job_id).values(status="done", locked_at=None, last_error=None))
+        await db.commit()
+
+    @classmethod
+    async def fail(cls, db: AsyncSession, job_id: UUID, error: str, retry_in: Optional[float]):
+        """Queues the job again after `retry_in` seconds, or marks it failed for good when that is None."""
+        values = dict(locked_at=None, last_error=error)
+        if retry_in is None:
+            values["status"] = "failed"
+        else:
+            values.update(status="queued", run_at=datetime.utcnow() + timedelta(seconds=retry_in))
+        await db.execute(update(cls).where(cls.id == job_id).values(**values))
+        await db.commit()
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.jobs.job.models import Job
+from src.settings import config
+from src.utils.metrics import registry
+from src.utils.single_psql_db import get_db
+
+__all__ = ["job_handler", "enqueue", "JobWorker", "job_worker"]
+
+logger = logging.getLogger("src.jobs")
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+JOB_HANDLERS: Dict[str, JobHandler] = {}
+
+jobs_processed = registry.counter("jobs_processed_total", "Background job runs by name and result.",
+                                  ("name", "result"))
+job_duration = registry.histogram("job_duration_seconds", "Background job run time.", ("name",))
+
+
+def job_handler(name: str):
+    """Registers `fn(payload)` as the handler of jobs called `name`."""
+
+    def register(fn: JobHandler) -> JobHandler:
+        if name in JOB_HANDLERS:
+            raise ValueError(f"Job handler already registered: {name}")
+        JOB_HANDLERS[name] = fn
+        return fn
+
+    return register
+
+
+async def enqueue(db: AsyncSession, name: str, payload: Dict[str, Any], delay: float = 0,
+                  max_attempts: Optional[int] = None) -> Job:
+    """Persists a job and returns without running it, a worker picks it up after the commit."""
+    if name not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job: {name}")
+    job = await Job.enqueue(db, name, payload, max_attempts=max_attempts or config.JOBS_MAX_ATTEMPTS, delay=delay)
+    job_worker.wake()
+    return job
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with full jitter, capped at JOBS_RETRY_MAX."""
+    return random.uniform(0, min(config.JOBS_RETRY_MAX, config.JOBS_RETRY_BASE * 2 ** (attempts - 1)))
+
+
+class JobWorker:
+    """Claims due jobs from the jobs table and runs at most `concurrency` of them at a time."""
+
+    def __init__(self, concurrency: int, poll_interval: float, lock_timeout: float):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lock_timeout = lock_timeout
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._running: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def wake(self):
+        """Skips the rest of the poll interval, used after an enqueue in the same process."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self, job: Job):
+        handler = JOB_HANDLERS.get(job.name)
+        start = time.perf_counter()
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job {job.name}")
+            await handler(job.payload)
+        except Exception:
+            error = traceback.format_exc(limit=5)
+            retry_in = retry_delay(job.attempts) if job.attempts < job.max_attempts else None
+            logger.warning("job %s %s attempt %d/%d failed%s\n%s", job.name, job.id, job.attempts, job.max_attempts,
+                           "" if retry_in is None else f", retrying in {retry_in:.1f}s", error)
+            jobs_processed.labels(job.name, "retried" if retry_in is not None else "failed").inc()
+            async with get_db() as db:
+                await Job.fail(db, job.id, error, retry_in)
+        else:
+            jobs_processed.labels(job.name, "done").inc()
+            async with get_db() as db:
+                await Job.finish(db, job.id)
+        finally:
+            job_duration.labels(job.name).observe(time.perf_counter() - start)
+
+    async def run_once(self) -> int:
+        """Claims and starts as many due jobs as there are free slots, returns how many were started."""
+        free = self.concurrency - len(self._running)
+        if free <= 0:
+            return 0
+        async with get_db() as db:
+            jobs = await Job.claim(db, self.name, free, self.lock_timeout)
+        for job in jobs:
+            task = asyncio.create_task(self._run(job))
+            self._running.add(task)
+            task.add_done_callback(self._task_done)
+        return len(jobs)
+
+    def _task_done(self, task: asyncio.Task):
+        self._running.discard(task)
+        self.wake()
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        logger.info("job worker %s started, concurrency %d", self.name, self.concurrency)
+        while not self._stopping:
+            try:
+                started = await self.run_once()
+            except Exception:
+                logger.exception("claiming jobs failed")
+                started = 0
+            if started and len(self._running) < self.concurrency:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self.run())
+
+    async def stop(self, timeout: float = 30):
+        """Stops claiming and waits up to `timeout` seconds for running jobs, unfinished ones are
+        picked up again once their lock times out."""
+        self._stopping = True
+        self.wake()
+        if self._loop_task is not None:
+            await self._loop_task
+            self._loop_task = None
+        if self._running:
+            await asyncio.wait(self._running, timeout=timeout)
+
+
+job_worker = JobWorker(config.JOBS_CONCURRENCY, config.JOBS_POLL_INTERVAL, config.JOBS_LOCK_TIMEOUT)
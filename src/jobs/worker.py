@@ -0,0 +1,28 @@
+"""Standalone job worker: `python -m src.jobs.worker`, run with DEF_JOBS_RUN_IN_APP=false on the API."""
+import asyncio
+import logging
+import signal
+
+from src.jobs.job.service import job_worker
+from src.utils.single_psql_db import dispose_engine, init_psql_db
+
+# modules registering job handlers
+import src.auth.base.jobs  # noqa: F401
+
+
+async def main():
+    await init_psql_db()
+    loop = asyncio.get_running_loop()
+    stopping = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    job_worker.start()
+    await stopping.wait()
+    logging.getLogger("src.jobs").info("stopping, waiting for running jobs")
+    await job_worker.stop()
+    await dispose_engine()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
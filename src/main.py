@@ -1,17 +1,40 @@
+from src.utils.startup import startup_report, StartupReportMiddleware  # first, it times the imports below
+
+with startup_report.phase("settings"):
+    from src.settings import config
+if config.STARTUP_REPORT_ENABLED:
+    startup_report.time_imports()
+
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from src.utils.single_psql_db import init_psql_db
+from src.utils.single_psql_db import init_psql_db, dispose_engine, dispose_replicas, get_replicas
 from src.utils.exceptions import GeneralException
+from src.utils.responses import FastJSONResponse
+from src.utils.password_hasher import password_hasher
+from src.utils.cache import shared_cache
+from src.utils.instrumentation import MetricsMiddleware
+from src.utils.compression import CompressionMiddleware, available_encoders
+from src.utils.query_detector import install_query_detector
+from src.jobs.job.service import job_worker
+from src.utils.http_client import http_client
+from src.auth.base.google import google_jwks
 
 from src.auth.base.router import auth
 from src.users.user.router import users
+from src.internal.router import internal, metrics
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
+
+if config.SQL_DETECTOR_ENABLED:
+    install_query_detector()
 
 app.include_router(auth)
 app.include_router(users)
+if config.INTERNAL_ROUTES_ENABLED:
+    app.include_router(internal)
+if config.METRICS_ENABLED:
+    app.include_router(metrics)
 
 origins = ["*"]
 
@@ -23,11 +46,44 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if config.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        encoders=available_encoders(config.COMPRESSION_ENCODINGS),
+        minimum_size=config.COMPRESSION_MIN_SIZE,
+        content_types=config.COMPRESSION_CONTENT_TYPES,
+        thread_min_size=config.COMPRESSION_THREAD_MIN_SIZE,
+    )
+
+if config.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+if config.STARTUP_REPORT_ENABLED:
+    app.add_middleware(StartupReportMiddleware, report=startup_report)
+
+startup_report.imports_done()
+
 @app.on_event("startup")
 async def startup():
-    await init_psql_db()
+    # engine, http client and JWKS are created on first use, only the schema check runs here
+    with startup_report.phase(f"schema_{config.DB_SCHEMA_MODE}"):
+        await init_psql_db()
+    get_replicas().start_monitor(config.SQL_REPLICA_HEALTH_INTERVAL)
+    if config.JOBS_RUN_IN_APP:
+        job_worker.start()
+    startup_report.ready()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await job_worker.stop()
+    password_hasher.shutdown()
+    await dispose_replicas()
+    await shared_cache.backend.close()
+    await google_jwks.stop()
+    await http_client.close()
+    await dispose_engine()
 
 @app.exception_handler(GeneralException)
 async def general_exception_handler(request: Request, exc: GeneralException):
-    return JSONResponse(status_code=exc.general_response.status, content=exc.general_response.model_dump(),
+    return FastJSONResponse(status_code=exc.general_response.status, content=exc.general_response,
                         headers=exc.headers)
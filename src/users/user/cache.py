@@ -0,0 +1,52 @@
+from typing import Dict, Optional
+from uuid import UUID
+
+from src.settings import config
+from src.users.user.schemas import UserSnapshot
+from src.utils.cache import TTLCache, shared_cache
+
+__all__ = ["current_user_cache", "cached_user", "remember_user", "forget_user", "USERS_TAG", "user_tag",
+           "invalidate_user"]
+
+# shared_cache tags of the UserService payloads, every listing carries USERS_TAG
+USERS_TAG = "users"
+
+# JWT subject (email) -> UserSnapshot. Per process, so another worker may serve
+# a stale snapshot for at most CURRENT_USER_CACHE_TTL seconds after a write.
+current_user_cache = TTLCache(maxsize=config.CURRENT_USER_CACHE_SIZE, ttl=config.CURRENT_USER_CACHE_TTL)
+
+# user id -> the email its snapshot is cached under, so a write drops the snapshot without a scan.
+# Pruned once it holds twice as many ids as the cache can, entries of cached snapshots are always kept.
+_snapshot_emails: Dict[UUID, str] = {}
+
+
+def cached_user(email: str) -> Optional[UserSnapshot]:
+    return current_user_cache.get(email)
+
+
+def remember_user(email: str, snapshot: UserSnapshot):
+    current_user_cache.set(email, snapshot)
+    _snapshot_emails[snapshot.id] = email
+    if len(_snapshot_emails) > 2 * max(current_user_cache.maxsize, 1):
+        for user_id, cached_email in list(_snapshot_emails.items()):
+            if cached_email not in current_user_cache:
+                del _snapshot_emails[user_id]
+
+
+def forget_user(user_id: UUID):
+    email = _snapshot_emails.pop(user_id, None)
+    if email is not None:
+        current_user_cache.delete(email)
+
+
+def user_tag(user_id: UUID) -> str:
+    return f"user:{user_id}"
+
+
+async def invalidate_user(user_id: Optional[UUID] = None):
+    """Drops cached listings, and the user's own entries when `user_id` is given."""
+    if user_id is None:
+        await shared_cache.invalidate_tags(USERS_TAG)
+        return
+    forget_user(user_id)
+    await shared_cache.invalidate_tags(USERS_TAG, user_tag(user_id))
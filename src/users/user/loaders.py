@@ -0,0 +1,20 @@
+from typing import Dict, List
+from uuid import UUID
+
+from src.settings import config
+from src.users.user.models import User
+from src.utils.loader import BatchLoader
+from src.utils.single_psql_db import get_db
+
+__all__ = ["user_by_id"]
+
+
+async def _users_by_id(user_ids: List[UUID]) -> Dict[UUID, User]:
+    async with get_db() as db:
+        return {user.id: user for user in await User.get_many(db, User.id, user_ids)}
+
+
+# concurrent User.by_id style reads of one process, coalesced into one query per batch. They read
+# outside the request's session: a second checkout, and they never see its uncommitted writes.
+user_by_id: BatchLoader[UUID, User] = BatchLoader("user_by_id", _users_by_id, config.USER_LOADER_MAX_BATCH_SIZE,
+                                                  config.USER_LOADER_WINDOW)
@@ -1,18 +1,38 @@
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import select
+from sqlalchemy import select, update, Index, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects import postgresql, sqlite
 
 from uuid import UUID, uuid4
-from typing import Optional
+from typing import Iterable, List, Optional, Set
+from datetime import datetime
 
 from src.users.user.schemas import UserCreate, UserUpdate
-from src.utils.single_psql_db import Base, get_db
+from src.users.user.cache import invalidate_user
+from src.utils.single_psql_db import Base, commit, after_commit
 from src.utils.exceptions import BadRequestError
+from src.utils.password_hasher import password_hasher
 
 from asyncpg.exceptions import UniqueViolationError
 from sqlalchemy.exc import IntegrityError
 
+def _pg_trgm_installed(ddl, target, bind, **kw) -> bool:
+    # the extension comes from migration 9d4e2b7c1a08 (or a DBA), create_all never installs it
+    return bind.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_updated_at_id", "updated_at", "id"),
+        # trigram indexes for UserService.get_users search, see src/utils/search.py; create_all skips
+        # them on databases without pg_trgm
+        Index("ix_users_first_name_trgm", "first_name", postgresql_using="gin",
+              postgresql_ops={"first_name": "gin_trgm_ops"}).ddl_if(dialect="postgresql", callable_=_pg_trgm_installed),
+        Index("ix_users_last_name_trgm", "last_name", postgresql_using="gin",
+              postgresql_ops={"last_name": "gin_trgm_ops"}).ddl_if(dialect="postgresql", callable_=_pg_trgm_installed),
+        Index("ix_users_email_trgm", "email", postgresql_using="gin",
+              postgresql_ops={"email": "gin_trgm_ops"}).ddl_if(dialect="postgresql", callable_=_pg_trgm_installed),
+    )
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
     email: Mapped[str] = mapped_column(nullable=False, unique=True, index=True)
     first_name: Mapped[str] = mapped_column(nullable=False)
@@ -20,65 +40,107 @@ class User(Base):
     password: Mapped[str] = mapped_column(nullable=False)
     is_active: Mapped[bool] = mapped_column(nullable=False, default=True)
     is_superuser: Mapped[bool] = mapped_column(nullable=False, default=False)
+    # the `pv` claim of access tokens, bumped when the user's roles change so older tokens stop working
+    permissions_version: Mapped[int] = mapped_column(nullable=False, default=0, server_default="0")
+
+    @classmethod
+    async def by_email(cls, db: AsyncSession, email: str) -> "User":
+        stmt = select(cls).where(cls.email == email).execution_options(replica=True)
+        return await db.scalar(stmt)
 
     @classmethod
-    async def by_email(cls, email: str) -> "User":
-        async with get_db() as db:
-            stmt = select(cls).where(cls.email == email)
-            return await db.scalar(stmt)
+    async def by_id(cls, db: AsyncSession, user_id: UUID, replica: bool = True) -> "User":
+        stmt = select(cls).where(cls.id == user_id).execution_options(replica=replica)
+        return await db.scalar(stmt)
+
+    @classmethod
+    async def version_of(cls, db: AsyncSession, user_id: UUID) -> Optional[datetime]:
+        """updated_at only, enough to answer a conditional GET without loading the row.
+
+        Read from the primary: a lagging replica would still hold the old version and answer 304 to a
+        client whose copy the last write made stale."""
+        stmt = select(cls.updated_at).where(cls.id == user_id)
+        return await db.scalar(stmt)
 
     @classmethod
-    async def by_id(cls, user_id: UUID) -> "User":
-        async with get_db() as db:
-            stmt = select(cls).where(cls.id == user_id)
-            return await db.scalar(stmt)
+    async def is_first_user(cls, db: AsyncSession) -> bool:
+        stmt = select(cls)
+        any_user = await db.scalar(stmt)
+        if any_user is None:
+            return True
+        return False
 
     @classmethod
-    async def is_first_user(cls) -> bool:
-        async with get_db() as db:
-            stmt = select(cls)
-            any_user = await db.scalar(stmt)
-            if any_user is None:
-                return True
-            return False
+    async def create(cls, db: AsyncSession, user: UserCreate) -> "User":
+        values = user.model_dump(exclude_none=True)
+        values["password"] = await password_hasher.hash(user.password.get_secret_value())
+        try:
+            new_user = await cls.insert_returning(db, values)
+            await commit(db)
+            await after_commit(db, invalidate_user)
+            return new_user
+        except (UniqueViolationError, IntegrityError) as e:
+            await db.rollback()
+            raise BadRequestError("Kullanıcı oluşturulamadı. Bu e-posta adresi kullanılmaktadır.")
 
     @classmethod
-    async def create(cls, user: UserCreate) -> "User":
-        async with get_db() as db:
-            try:
-                new_user = cls(**user.model_dump(exclude_none=True))
-                db.add(new_user)
-                await db.commit()
-                await db.refresh(new_user)
-                return new_user
-            except (UniqueViolationError, IntegrityError) as e:
-                raise BadRequestError("Kullanıcı oluşturulamadı. Bu e-posta adresi kullanılmaktadır.")
+    async def update(cls, db: AsyncSession, user_id: UUID, data: UserUpdate) -> Optional["User"]:
+        values = data.model_dump(exclude_none=True)
+        if data.password is not None:
+            values["password"] = await password_hasher.hash(data.password.get_secret_value())
+        if not values:
+            return await cls.by_id(db, user_id)
+        try:
+            user = await cls.update_returning(db, cls.id == user_id, values)
+            await commit(db)
+        except (UniqueViolationError, IntegrityError) as e:
+            await db.rollback()
+            raise BadRequestError("Kullanıcı güncellenemedi. Bu e-posta adresi kullanılmaktadır.")
+        if user is not None:
+            await after_commit(db, invalidate_user, user_id)
+        return user
 
     @classmethod
-    async def update(cls, user_id: UUID, data: UserUpdate) -> Optional["User"]:
-        async with get_db() as db:
-            user = await db.scalar(select(cls).where(cls.id == user_id))
-            if user is None:
-                return None
-            for field, value in data.model_dump(exclude_none=True).items():
-                setattr(user, field, value)
-
-            try:
-                await db.commit()
-                await db.refresh(user)
-                return user
-            except (UniqueViolationError, IntegrityError) as e:
-                raise BadRequestError("Kullanıcı güncellenemedi. Bu e-posta adresi kullanılmaktadır.")
+    async def delete(cls, db: AsyncSession, user_id: UUID) -> Optional["User"]:
+        try:
+            user = await cls.delete_returning(db, cls.id == user_id)
+            await commit(db)
+        except (UniqueViolationError, IntegrityError):
+            await db.rollback()
+            raise BadRequestError("Kullanıcı silinemedi. İletişime geçiniz.")
+        if user is not None:
+            await after_commit(db, invalidate_user, user_id)
+        return user
+
+    @classmethod
+    async def bump_permissions_version(cls, db: AsyncSession, where_query):
+        """Revokes the access tokens of the matching users, their permissions changed. Flushed, not committed."""
+        stmt = (update(cls).where(where_query).values(permissions_version=cls.permissions_version + 1)
+                .returning(cls.id).execution_options(synchronize_session=False))
+        for user_id in (await db.scalars(stmt)).all():
+            await after_commit(db, invalidate_user, user_id)
+
+    @classmethod
+    async def bulk_insert(cls, db: AsyncSession, rows: List[dict]) -> Set[str]:
+        """Multi-row INSERT ... ON CONFLICT (email) DO NOTHING, returns the emails that were inserted.
+
+        Rows must be complete (id, hashed password, timestamps), no ORM defaults run here.
+        """
+        if not rows:
+            return set()
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        stmt = (
+            dialect.insert(cls.__table__)
+            .on_conflict_do_nothing(index_elements=[cls.__table__.c.email])
+            .returning(cls.__table__.c.email)
+        )
+        result = await db.execute(stmt, rows)
+        return set(result.scalars().all())
 
     @classmethod
-    async def delete(cls, user_id: UUID) -> bool:
-        async with get_db() as db:
-            user = await db.scalar(select(cls).where(cls.id == user_id))
-            if user is None:
-                return None
-            try:
-                await db.delete(user)
-                await db.commit()
-                return user
-            except (UniqueViolationError, IntegrityError):
-                raise BadRequestError("Kullanıcı silinemedi. İletişime geçiniz.")
+    async def stream_all(cls, db: AsyncSession, columns: Iterable, batch_size: int = 1000):
+        """Yields batches of rows ordered by id, read through a server side cursor."""
+        stmt = select(*columns).order_by(cls.id).execution_options(yield_per=batch_size)
+        result = await db.stream(stmt)
+        async for batch in result.partitions():
+            yield batch
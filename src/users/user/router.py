@@ -1,15 +1,21 @@
-from fastapi import APIRouter, Depends
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from src.utils.responses import FastJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.utils.schemas import PaginationGet
 from src.auth.current_user import get_current_user
-from src.users.user.models import User
+from src.utils.single_psql_db import get_session
+from src.utils.query_detector import query_budget
+from src.utils.conditional import conditional_response, etag_matches, not_modified
 
-from typing import Optional
+from typing import Literal, Optional
 from uuid import UUID
 
-from src.users.user.schemas import UserCreate, UserUpdate
+from src.users.user.schemas import UserCreate, UserUpdate, UserSnapshot, UserBatchGet
 from src.users.user.service import UserService
+from src.utils.exceptions import BadRequestError
+from src.settings import config
 
 
 users = APIRouter(
@@ -18,32 +24,72 @@ users = APIRouter(
     responses={404: {"SAGA-SOFT": "SAGA-SOFT"}},
 )
 
-@users.get("")
-async def get_users(data: PaginationGet = Depends(),
-                    current_user: User = Depends(get_current_user)):
-    content = await UserService.get_users(pagination_data=data, actor=current_user)
-    return JSONResponse(status_code=content.status, content=content.model_dump())
+@users.get("", dependencies=[Depends(query_budget(3))])
+async def get_users(request: Request,
+                    data: PaginationGet = Depends(),
+                    current_user: UserSnapshot = Depends(get_current_user),
+                    db: AsyncSession = Depends(get_session)):
+    content, etag = await UserService.get_users(db=db, pagination_data=data, actor=current_user)
+    return conditional_response(request, content, etag, cache_control=config.USERS_LIST_CACHE_CONTROL)
 
-@users.get("/{user_id}")
-async def get_user(user_id: UUID,
-                   current_user: User = Depends(get_current_user)):
-    content = await UserService.get_user(user_id=user_id, actor=current_user)
-    return JSONResponse(status_code=content.status, content=content.model_dump())
+@users.post("/bulk")
+async def bulk_create_users(request: Request,
+                            current_user: UserSnapshot = Depends(get_current_user),
+                            db: AsyncSession = Depends(get_session)):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type == "text/csv":
+        fmt = "csv"
+    elif content_type in ("application/x-ndjson", "application/jsonl", "application/json-lines"):
+        fmt = "ndjson"
+    else:
+        raise BadRequestError("Desteklenmeyen içerik tipi. text/csv veya application/x-ndjson gönderiniz.")
+    resp = await UserService.bulk_create(db=db, stream=request.stream(), fmt=fmt, actor=current_user)
+    return FastJSONResponse(status_code=resp.status, content=resp)
 
-@users.post("")
+@users.post("/batch-get", dependencies=[Depends(query_budget(2))])
+async def batch_get_users(data: UserBatchGet,
+                          current_user: UserSnapshot = Depends(get_current_user)):
+    # one query for all ids instead of a GET /users/{id} per id
+    resp = await UserService.batch_get(user_ids=data.ids, actor=current_user)
+    return FastJSONResponse(status_code=resp.status, content=resp)
+
+@users.get("/export")
+async def export_users(format: Literal["ndjson", "csv"] = "ndjson",
+                       current_user: UserSnapshot = Depends(get_current_user)):
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(UserService.export(fmt=format, actor=current_user), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="users.{format}"'})
+
+@users.get("/{user_id}", dependencies=[Depends(query_budget(3))])
+async def get_user(request: Request, user_id: UUID,
+                   current_user: UserSnapshot = Depends(get_current_user),
+                   db: AsyncSession = Depends(get_session)):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        # revalidation: compare against updated_at before loading and serializing the row
+        etag = await UserService.get_user_etag(db=db, user_id=user_id, actor=current_user)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, cache_control=config.USERS_CACHE_CONTROL)
+    content, etag = await UserService.get_user(db=db, user_id=user_id, actor=current_user)
+    return conditional_response(request, content, etag, cache_control=config.USERS_CACHE_CONTROL)
+
+@users.post("", dependencies=[Depends(query_budget(2))])
 async def create_user(user: UserCreate,
-                      current_user: User = Depends(get_current_user)):
-    resp = await UserService.create(user=user, actor=current_user)
-    return JSONResponse(status_code=resp.status, content=resp.model_dump())
+                      current_user: UserSnapshot = Depends(get_current_user),
+                      db: AsyncSession = Depends(get_session)):
+    resp = await UserService.create(db=db, user=user, actor=current_user)
+    return FastJSONResponse(status_code=resp.status, content=resp)
 
-@users.put("/{user_id}")
+@users.put("/{user_id}", dependencies=[Depends(query_budget(2))])
 async def update_user(user_id: UUID, data: UserUpdate,
-                      current_user: User = Depends(get_current_user)):
-    resp = await UserService.update(user_id=user_id, data=data, actor=current_user)
-    return JSONResponse(status_code=resp.status, content=resp.model_dump())
+                      current_user: UserSnapshot = Depends(get_current_user),
+                      db: AsyncSession = Depends(get_session)):
+    resp = await UserService.update(db=db, user_id=user_id, data=data, actor=current_user)
+    return FastJSONResponse(status_code=resp.status, content=resp)
 
-@users.delete("/{user_id}")
+@users.delete("/{user_id}", dependencies=[Depends(query_budget(2))])
 async def delete_user(user_id: UUID,
-                      current_user: User = Depends(get_current_user)):
-    resp = await UserService.delete(user_id=user_id, actor=current_user)
-    return JSONResponse(status_code=resp.status, content=resp.model_dump())
+                      current_user: UserSnapshot = Depends(get_current_user),
+                      db: AsyncSession = Depends(get_session)):
+    resp = await UserService.delete(db=db, user_id=user_id, actor=current_user)
+    return FastJSONResponse(status_code=resp.status, content=resp)
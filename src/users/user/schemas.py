@@ -1,27 +1,24 @@
-from pydantic import BaseModel, EmailStr, SecretStr, field_validator
-from typing import Optional
-from passlib.context import CryptContext
+from pydantic import BaseModel, EmailStr, Field, SecretStr
+from typing import FrozenSet, List, Optional
+from uuid import UUID
 
 from src.utils.schemas import UUIDView
+from src.settings import config
 
 __all__ = [
     "UserCreate",
     "UserUpdate",
     "UserMiniView",
     "UserView",
+    "UserSnapshot",
+    "UserBulkError",
+    "UserBulkResult",
+    "UserBatchGet",
+    "UserBatchView",
 ]
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-class UserPassHashMixin:
-    @field_validator("password")
-    def password_validator(cls, v):
-        if v:
-            print(v.get_secret_value())
-            return pwd_context.hash(v.get_secret_value())
-        return v
-
-class UserCreate(BaseModel, UserPassHashMixin):
+# passwords stay plain here, they are hashed off the event loop by User.create / User.update
+class UserCreate(BaseModel):
     email: EmailStr
     password: SecretStr
     first_name: str
@@ -29,7 +26,7 @@ class UserCreate(BaseModel, UserPassHashMixin):
     is_active: bool = True
 
 
-class UserUpdate(BaseModel, UserPassHashMixin):
+class UserUpdate(BaseModel):
     email: Optional[EmailStr] = None
     password: Optional[SecretStr] = None
     first_name: Optional[str] = None
@@ -64,3 +61,40 @@ class UserMeView(BaseModel, UUIDView):
 
     class Config:
         from_attributes = True
+
+
+class UserSnapshot(BaseModel):
+    """Just enough of a user to authenticate and authorize a request."""
+    id: UUID
+    email: str
+    is_active: bool
+    is_superuser: bool
+    permissions_version: int = 0
+    permissions: FrozenSet[str] = frozenset()  # from the access token, see src/auth/access/service.py
+
+    class Config:
+        from_attributes = True
+        frozen = True
+
+
+class UserBulkError(BaseModel):
+    row: int
+    email: Optional[str] = None
+    error: str
+
+
+class UserBulkResult(BaseModel):
+    received: int = 0
+    created: int = 0
+    failed: int = 0
+    errors: List[UserBulkError] = []
+    errors_truncated: bool = False
+
+
+class UserBatchGet(BaseModel):
+    ids: List[UUID] = Field(min_length=1, max_length=config.USERS_BATCH_GET_MAX_IDS)
+
+
+class UserBatchView(BaseModel):
+    items: List[UserView]  # in request order, duplicates once
+    missing: List[UUID] = []
@@ -1,76 +1,417 @@
-from src.users.user.schemas import UserCreate, UserUpdate, UserMiniView
+from src.users.user.schemas import (UserCreate, UserUpdate, UserMiniView, UserView, UserSnapshot, UserBulkError,
+                                    UserBulkResult, UserBatchView)
 from src.users.user.models import User
+from src.users.user.loaders import user_by_id
+from src.users.user.cache import USERS_TAG, user_tag, invalidate_user
 
-from src.utils.single_psql_db import get_db
-from src.utils.pagination import get_pagination_info
+from src.utils.pagination import get_pagination_info, encode_cursor, decode_cursor
 from src.utils.exceptions import NotFoundError, BadRequestError
 from src.utils.schemas import GeneralResponse, PaginationGet, ListView
+from src.utils.search import get_search_backend
+from src.utils.streaming import iter_lines, iter_chunks
+from src.utils.password_hasher import password_hasher
+from src.utils.single_psql_db import get_db, commit, after_commit
+from src.utils.cache import shared_cache
+from src.utils.conditional import make_etag
+from src.settings import config
 
 from src.auth.access.service import has_access, need_access
 
-from sqlalchemy import select, func
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
-from typing import Optional, List, Union
-from uuid import UUID
+from sqlalchemy.exc import SQLAlchemyError
+from typing import Optional, List, Union, AsyncIterator, Tuple
+from uuid import UUID, uuid4
+from datetime import datetime
+from pydantic import ValidationError
+from collections import deque
+import csv
+import io
+import json
 from asyncpg.exceptions import UniqueViolationError
 from sqlalchemy.exc import IntegrityError
 
+USER_EXPORT_COLUMNS = (User.id, User.email, User.first_name, User.last_name, User.is_active, User.is_superuser,
+                       User.created_at, User.updated_at)
+
+# GET /users items are UserMiniView's fields, read as plain columns instead of User entities
+USER_LIST_FIELDS = tuple(UserMiniView.model_fields)
+
+class _LineFeed:
+    """Lines for a csv.reader, refilled between records: the reader pulls synchronously, the body arrives async."""
+
+    def __init__(self):
+        self.lines = deque()
+
+    def extend(self, lines: List[str]):
+        self.lines.extend(line + "\n" for line in lines)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
 class UserService:
 
     @staticmethod
-    async def create(user: UserCreate, actor: User):
+    async def create(db: AsyncSession, user: UserCreate, actor: UserSnapshot):
         need_access(actor, ["*", "user.create"])
-        await User.create(user)
+        await User.create(db, user)
         return GeneralResponse(status=201, message="User created successfully.")
 
     @staticmethod
-    async def get_users(pagination_data: PaginationGet, actor: User):
+    def _pack(response: GeneralResponse, etag: str) -> bytes:
+        # cached payloads carry their ETag, so a cache hit answers conditional GETs without the DB
+        return etag.encode() + b"\n" + response.__pydantic_serializer__.to_json(response)
+
+    @staticmethod
+    def _unpack(payload: bytes) -> Tuple[GeneralResponse, str]:
+        etag, _, body = payload.partition(b"\n")
+        return GeneralResponse.model_validate_json(body), etag.decode()
+
+    @staticmethod
+    def user_etag(user_id: UUID, updated_at: datetime) -> str:
+        return make_etag("user", user_id, updated_at.isoformat())
+
+    @staticmethod
+    def list_etag(pagination_data: PaginationGet, users, count: Optional[int], has_next: Optional[bool]) -> str:
+        # the page's ids and newest updated_at plus the total, any insert, delete or edit changes one of them
+        newest = max((user.updated_at for user in users), default=None)
+        return make_etag("users", pagination_data.model_dump_json(), count, has_next, newest,
+                         ",".join(str(user.id) for user in users))
+
+    @staticmethod
+    async def get_users(db: AsyncSession, pagination_data: PaginationGet, actor: UserSnapshot) -> Tuple[GeneralResponse, str]:
         # need_access(actor, ["*", "user.get"])
-        async with get_db() as db:
-            where_query = None
-            if pagination_data.search:
-                where_query = (
-                        (User.first_name.like(f"%{pagination_data.search}%")) |
-                        (User.last_name.like(f"%{pagination_data.search}%")) |
-                        (User.email.like(f"%{pagination_data.search}%"))
-                )
-            if where_query is not None:
-                query = select(User).where(where_query)
+        key = f"users:list:{pagination_data.model_dump_json()}"
+        payload = await shared_cache.get_or_set(key, lambda: UserService._list_users(db, pagination_data),
+                                                tags=(USERS_TAG,))
+        return UserService._unpack(payload)
+
+    @staticmethod
+    async def _list_users(db: AsyncSession, pagination_data: PaginationGet) -> bytes:
+        return UserService._pack(*await UserService._query_users(db, pagination_data))
+
+    @staticmethod
+    def _list_columns(pagination_data: PaginationGet) -> Tuple[Tuple[str, ...], list]:
+        """Item fields of the listing and the columns to select: those fields first, then id and updated_at
+        (for the ETag and cursors) when they are not among them."""
+        requested = pagination_data.field_names
+        if requested is None:
+            names = USER_LIST_FIELDS
+        else:
+            unknown = requested.difference(USER_LIST_FIELDS)
+            if unknown:
+                raise BadRequestError(f"Geçersiz alan: {', '.join(sorted(unknown))}. "
+                                      f"Geçerli alanlar: {', '.join(USER_LIST_FIELDS)}.")
+            names = tuple(name for name in USER_LIST_FIELDS if name in requested)
+        columns = [getattr(User, name) for name in names]
+        columns += [column for column in (User.id, User.updated_at) if column.key not in names]
+        return names, columns
+
+    @staticmethod
+    def _list_items(names: Tuple[str, ...], rows) -> List[dict]:
+        # rows come straight from the table, no per row validation or ORM state; zip drops the trailing
+        # bookkeeping columns
+        return [dict(zip(names, row)) for row in rows]
+
+    @staticmethod
+    async def _query_users(db: AsyncSession, pagination_data: PaginationGet):
+        names, columns = UserService._list_columns(pagination_data)
+        where_query = rank = None
+        if pagination_data.search:
+            search_backend = get_search_backend(db)
+            search_columns = (User.first_name, User.last_name, User.email)
+            where_query = search_backend.filter(search_columns, pagination_data.search)
+            rank = search_backend.rank(search_columns, pagination_data.search)
+        query = select(*columns)
+        if where_query is not None:
+            query = query.where(where_query)
+        query = query.execution_options(replica=True)
+        if pagination_data.is_keyset:
+            return await UserService._get_users_keyset(db, query, pagination_data, names)
+        count_mode = pagination_data.count
+        if count_mode == "exact":
+            # page and total in one statement, count(*) over () is evaluated before LIMIT/OFFSET
+            query = query.add_columns(func.count().over().label("total"))
+        if pagination_data.paginate:
+            limit = pagination_data.pageSize + 1 if count_mode == "none" else pagination_data.pageSize
+            query = query.limit(limit).offset(
+                (pagination_data.page - 1) * pagination_data.pageSize
+            )
+        if pagination_data.order:
+            query = query.order_by(User.updated_at.desc())
+        elif rank is not None:
+            query = query.order_by(rank.desc(), User.id)
+
+        count, has_next, estimated = None, None, False
+        rows = (await db.execute(query)).all()
+        if count_mode == "exact":
+            if rows:
+                count = rows[0].total
+            elif pagination_data.page > 1:
+                count = await User.get_count(db, where_query)
             else:
-                query = select(User)
-            if pagination_data.paginate:
-                query = query.limit(pagination_data.pageSize).offset(
-                    (pagination_data.page - 1) * pagination_data.pageSize
-                )
-            if pagination_data.order:
-                query = query.order_by(User.updated_at.desc())
+                count = 0
+        elif count_mode == "estimate":
+            count, estimated = await User.estimate_count(db, where_query)
+        elif pagination_data.paginate:
+            has_next = len(rows) > pagination_data.pageSize
+            rows = rows[:pagination_data.pageSize]
 
-            users = await db.scalars(query)
-            users = users.all()
+        pagination_info = get_pagination_info(total_items=count, current_page=pagination_data.page,
+                                              page_size=pagination_data.pageSize, has_next=has_next,
+                                              current_page_size=len(rows), estimated=estimated)
 
-            count = await User.get_count(where_query)
-            pagination_info = get_pagination_info(total_items=count, current_page=pagination_data.page,
-                                                  page_size=pagination_data.pageSize)
+        response = GeneralResponse(status=200, message="Users listed.",
+                                   details=ListView[dict](info=pagination_info,
+                                                          items=UserService._list_items(names, rows)))
+        return response, UserService.list_etag(pagination_data, rows, count, has_next)
 
-            return GeneralResponse(status=200, message="Users listed.",
-                                   details=ListView[UserMiniView](info=pagination_info, items=users))
+    @staticmethod
+    async def _get_users_keyset(db: AsyncSession, query, pagination_data: PaginationGet, names: Tuple[str, ...]):
+        # (updated_at, id) desc, served by ix_users_updated_at_id, so every page is an index range scan
+        sort_key = tuple_(User.updated_at, User.id)
+        page_size = pagination_data.pageSize
+        backwards = pagination_data.before is not None
+        cursor = pagination_data.before if backwards else pagination_data.after
+        if cursor is not None:
+            updated_at, user_id = decode_cursor(cursor, 2)
+            try:
+                cursor_key = (datetime.fromisoformat(updated_at), UUID(user_id))
+            except (TypeError, ValueError):
+                raise BadRequestError("Geçersiz sayfa imleci.")
+            query = query.where(sort_key > cursor_key if backwards else sort_key < cursor_key)
+        if backwards:
+            query = query.order_by(User.updated_at.asc(), User.id.asc())
+        else:
+            query = query.order_by(User.updated_at.desc(), User.id.desc())
+
+        rows = (await db.execute(query.limit(page_size + 1))).all()
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+
+        next_cursor = prev_cursor = None
+        if rows:
+            if has_more or backwards:
+                next_cursor = encode_cursor(rows[-1].updated_at, rows[-1].id)
+            if (has_more and backwards) or (not backwards and cursor is not None):
+                prev_cursor = encode_cursor(rows[0].updated_at, rows[0].id)
+        response = GeneralResponse(status=200, message="Users listed.",
+                                   details=ListView[dict](items=UserService._list_items(names, rows),
+                                                          nextCursor=next_cursor, prevCursor=prev_cursor))
+        return response, UserService.list_etag(pagination_data, rows, None, has_more)
 
     @staticmethod
-    async def get_user(user_id: UUID, actor: User):
+    async def get_user_etag(db: AsyncSession, user_id: UUID, actor: UserSnapshot) -> str:
+        """The current ETag of the user, from the cached payload or else from updated_at alone."""
         need_access(actor, ["*", "user.get"])
-        user = await User.by_id(user_id)
+        payload = await shared_cache.get(f"users:{user_id}")
+        if payload is not None:
+            return payload.partition(b"\n")[0].decode()
+        updated_at = await User.version_of(db, user_id)
+        if updated_at is None:
+            raise NotFoundError("User not found.")
+        return UserService.user_etag(user_id, updated_at)
+
+    @staticmethod
+    async def get_user(db: AsyncSession, user_id: UUID, actor: UserSnapshot) -> Tuple[GeneralResponse, str]:
+        need_access(actor, ["*", "user.get"])
+        payload = await shared_cache.get_or_set(f"users:{user_id}", lambda: UserService._load_user(db, user_id),
+                                                tags=(user_tag(user_id),))
+        return UserService._unpack(payload)
+
+    @staticmethod
+    async def _load_user(db: AsyncSession, user_id: UUID) -> bytes:
+        # from the primary, get_user_etag answers conditional GETs with the ETag cached here
+        user = await User.by_id(db, user_id, replica=False)
         if user is None:
             raise NotFoundError("User not found.")
-        return GeneralResponse(status=200, message="User found.", data=user)
+        response = GeneralResponse(status=200, message="User found.", details=UserView.model_validate(user))
+        return UserService._pack(response, UserService.user_etag(user.id, user.updated_at))
+
+    @staticmethod
+    async def batch_get(user_ids: List[UUID], actor: UserSnapshot) -> GeneralResponse:
+        need_access(actor, ["*", "user.get"])
+        user_ids = list(dict.fromkeys(user_ids))
+        found = await user_by_id.load_many(user_ids)
+        details = UserBatchView(items=[UserView.model_validate(found[user_id]) for user_id in user_ids if user_id in found],
+                                missing=[user_id for user_id in user_ids if user_id not in found])
+        return GeneralResponse(status=200, message="Users found.", details=details)
 
     @staticmethod
-    async def update(user_id: UUID, data: UserUpdate, actor: User):
+    async def update(db: AsyncSession, user_id: UUID, data: UserUpdate, actor: UserSnapshot):
         need_access(actor, ["*", "user.update"])
-        await User.update(user_id, data)
+        await User.update(db, user_id, data)
         return GeneralResponse(status=200, message="User updated successfully.")
 
     @staticmethod
-    async def delete(user_id: UUID, actor: User):
+    async def delete(db: AsyncSession, user_id: UUID, actor: UserSnapshot):
         need_access(actor, ["*", "user.delete"])
-        await User.delete(user_id)
+        await User.delete(db, user_id)
         return GeneralResponse(status=200, message="User deleted successfully.")
+
+    @staticmethod
+    async def bulk_create(db: AsyncSession, stream: AsyncIterator[bytes], fmt: str, actor: UserSnapshot):
+        """Imports users from an NDJSON or CSV (with header) body, one record per line, chunk by chunk."""
+        need_access(actor, ["*", "user.create"])
+        report = UserBulkResult()
+        rows = UserService._parse_bulk_rows(iter_lines(stream, max_length=config.USERS_BULK_MAX_LINE_LENGTH), fmt)
+        async for chunk in iter_chunks(rows, config.USERS_BULK_CHUNK_SIZE):
+            await UserService._bulk_create_chunk(db, chunk, report)
+        return GeneralResponse(status=200, message="Users imported.", details=report)
+
+    @staticmethod
+    async def _parse_bulk_rows(lines: AsyncIterator[Tuple[int, Optional[str]]], fmt: str):
+        if fmt == "csv":
+            async for row in UserService._parse_csv_rows(lines):
+                yield row
+            return
+        async for line_number, line in lines:
+            if line is None:
+                yield line_number, UserService._too_long()
+                continue
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_number, "Geçersiz JSON."
+                continue
+            yield line_number, record if isinstance(record, dict) else "Satır bir JSON nesnesi olmalı."
+
+    @staticmethod
+    async def _parse_csv_rows(lines: AsyncIterator[Tuple[int, Optional[str]]]):
+        # one reader for the whole body: a quoted field may span lines (the export writes such fields), so
+        # the lines of a record are collected until its quotes balance and then handed to the reader.
+        # A record over the length cap is dropped (never fed to the reader) and reported as its row's error,
+        # its remaining lines are only counted for quotes.
+        feed = _LineFeed()
+        reader = csv.reader(feed)
+        header, record, start, quotes, length, too_long = None, [], 0, 0, -1, False
+        async for line_number, line in lines:
+            if not record and not too_long:
+                if line is not None and not line.strip():
+                    continue
+                start = line_number
+            if line is None:
+                # the dropped line's quotes are unknown, the record ends with it
+                record, quotes, too_long = [], 0, True
+            else:
+                quotes += line.count('"')
+                length += len(line) + 1
+                if not too_long and length > config.USERS_BULK_MAX_LINE_LENGTH:
+                    record, too_long = [], True
+                if not too_long:
+                    record.append(line)
+                if quotes % 2:
+                    continue
+            if too_long:
+                if header is None:  # nothing was imported yet, and the rows can't be read without it
+                    raise BadRequestError(f"{start}. satır {config.USERS_BULK_MAX_LINE_LENGTH} karakterden uzun.")
+                yield start, UserService._too_long()
+                record, quotes, length, too_long = [], 0, -1, False
+                continue
+            feed.extend(record)
+            values = next(reader)
+            record, quotes, length = [], 0, -1
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            yield start, {k: v for k, v in zip(header, values) if v != ""}
+        if too_long and header is not None:
+            yield start, UserService._too_long()
+        elif record:  # an unterminated quote, the reader ends the field at the end of the body
+            feed.extend(record)
+            values = next(reader, [])
+            if header is not None:
+                yield start, {k: v for k, v in zip(header, values) if v != ""}
+
+    @staticmethod
+    def _too_long() -> str:
+        return f"Kayıt {config.USERS_BULK_MAX_LINE_LENGTH} karakterden uzun."
+
+    @staticmethod
+    async def _bulk_create_chunk(db: AsyncSession, chunk: List[Tuple[int, Union[dict, str]]], report: UserBulkResult):
+        def fail(row: int, error: str, email: Optional[str] = None):
+            report.failed += 1
+            if len(report.errors) < config.USERS_BULK_ERROR_LIMIT:
+                report.errors.append(UserBulkError(row=row, email=email, error=error))
+            else:
+                report.errors_truncated = True
+
+        report.received += len(chunk)
+        valid, seen = [], set()
+        for row, record in chunk:
+            if isinstance(record, str):
+                fail(row, record)
+                continue
+            try:
+                user = UserCreate.model_validate(record)
+            except ValidationError as e:
+                fail(row, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()),
+                     record.get("email"))
+                continue
+            if user.email in seen:
+                fail(row, "Bu e-posta adresi dosyada tekrar ediyor.", user.email)
+                continue
+            seen.add(user.email)
+            valid.append((row, user))
+
+        hashes = await password_hasher.hash_many([user.password.get_secret_value() for _, user in valid])
+        now = datetime.utcnow()
+        rows = [
+            {**user.model_dump(exclude={"password"}), "id": uuid4(), "password": hashed, "is_superuser": False,
+             "created_at": now, "updated_at": now}
+            for (_, user), hashed in zip(valid, hashes)
+        ]
+        try:
+            inserted = await User.bulk_insert(db, rows)
+            await commit(db)
+            if inserted:
+                await after_commit(db, invalidate_user)
+        except SQLAlchemyError:
+            await db.rollback()
+            for row, user in valid:
+                fail(row, "Kullanıcı oluşturulamadı.", user.email)
+            return
+        report.created += len(inserted)
+        for row, user in valid:
+            if user.email not in inserted:
+                fail(row, "Bu e-posta adresi kullanılmaktadır.", user.email)
+
+    @staticmethod
+    def export(fmt: str, actor: UserSnapshot) -> AsyncIterator[bytes]:
+        need_access(actor, ["*", "user.get"])
+        return UserService._export_rows(fmt)
+
+    @staticmethod
+    async def _export_rows(fmt: str) -> AsyncIterator[bytes]:
+        # runs while the response streams, so it owns its session instead of the request one
+        names = [column.key for column in USER_EXPORT_COLUMNS]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        if fmt == "csv":
+            writer.writerow(names)
+        async with get_db() as db:
+            async for batch in User.stream_all(db, USER_EXPORT_COLUMNS):
+                for row in batch:
+                    values = [value.isoformat() if isinstance(value, datetime) else str(value) if isinstance(value, UUID)
+                              else value for value in row]
+                    if fmt == "csv":
+                        writer.writerow(values)
+                    else:
+                        buffer.write(json.dumps(dict(zip(names, values)), separators=(",", ":")))
+                        buffer.write("\n")
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue().encode()
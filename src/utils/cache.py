@@ -0,0 +1,373 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, KeysView, List, Optional, Set, Tuple
+
+from src.settings import config
+
+__all__ = ["TTLCache", "CacheBackend", "MemoryCacheBackend", "RedisCacheBackend", "Cache", "shared_cache"]
+
+# seconds a tag's generation is kept after its last invalidation, far longer than any fill
+GENERATION_TTL = 24 * 60 * 60
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after a TTL.
+
+    Meant for the event loop thread only, it does no locking.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether `key` is stored, expired or not, without touching the stats or the LRU order."""
+        return key in self._data
+
+    def keys(self) -> KeysView:
+        """The stored keys, expired or not, same as `in`."""
+        return self._data.keys()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class CacheBackend(ABC):
+    """Byte-valued cache shared by every worker of a deployment (or one process for `memory`).
+
+    Entries can carry tags, `invalidate_tags` drops every entry stored under any of them and
+    bumps the tags' generations.
+    """
+    name: str = ""
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return (await self.mget([key]))[0]
+
+    @abstractmethod
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str] = (),
+                  generations: Optional[List[int]] = None):
+        """With `generations`, read by `generations(tags)` before the value was loaded, the entry is
+        only stored while none of its tags has been invalidated since."""
+
+    @abstractmethod
+    async def generations(self, tags: List[str]) -> List[int]:
+        ...
+
+    @abstractmethod
+    async def delete(self, *keys: str):
+        ...
+
+    @abstractmethod
+    async def invalidate_tags(self, *tags: str):
+        ...
+
+    async def acquire(self, key: str, ttl: float) -> bool:
+        """Cross-worker fill lock for `key`, True when this caller should load it."""
+        return True
+
+    async def release(self, key: str):
+        pass
+
+    async def close(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class NullCacheBackend(CacheBackend):
+    name = "none"
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [None] * len(keys)
+
+    async def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str] = (),
+                  generations: Optional[List[int]] = None):
+        pass
+
+    async def generations(self, tags: List[str]) -> List[int]:
+        return [0] * len(tags)
+
+    async def delete(self, *keys: str):
+        pass
+
+    async def invalidate_tags(self, *tags: str):
+        pass
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process stand-in for Redis, for single worker deployments and local runs."""
+    name = "memory"
+
+    def __init__(self, maxsize: int):
+        self.entries = TTLCache(maxsize=maxsize, ttl=0)
+        self._tags: Dict[str, Set[str]] = {}
+        # tag -> invalidation count, a forgotten tag reads as 0 so a fill racing it is skipped too
+        self._generations = TTLCache(maxsize=maxsize, ttl=GENERATION_TTL)
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [self.entries.get(key) for key in keys]
+
+    async def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str] = (),
+                  generations: Optional[List[int]] = None):
+        tags = list(tags)
+        if generations is not None and await self.generations(tags) != generations:
+            return
+        self.entries.set(key, value, ttl=ttl)
+        for tag in tags:
+            keys = self._tags.setdefault(tag, set())
+            keys.add(key)
+            if len(keys) > self.entries.maxsize:
+                keys.intersection_update(self.entries.keys())
+
+    async def generations(self, tags: List[str]) -> List[int]:
+        return [self._generations.get(tag, 0) for tag in tags]
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self.entries.delete(key)
+
+    async def invalidate_tags(self, *tags: str):
+        for tag in tags:
+            self._generations.set(tag, self._generations.get(tag, 0) + 1)
+            for key in self._tags.pop(tag, ()):
+                self.entries.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.entries.stats(), "tags": len(self._tags)}
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis backend, tags are sets of keys next to the entries. Needs the `redis` extra."""
+    name = "redis"
+
+    # KEYS: the entry, then the generation key and the set of each tag. ARGV: value, ttl ms, generations
+    SET_IF_CURRENT = """
+local tags = (#KEYS - 1) / 2
+for i = 1, tags do
+    if (tonumber(redis.call('GET', KEYS[2 * i])) or 0) ~= tonumber(ARGV[2 + i]) then
+        return 0
+    end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+for i = 1, tags do
+    redis.call('SADD', KEYS[2 * i + 1], KEYS[1])
+    redis.call('PEXPIRE', KEYS[2 * i + 1], ARGV[2])
+end
+return 1
+"""
+
+    def __init__(self, url: str, prefix: str = ""):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis needs the redis extra, poetry install -E redis") from e
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._set_if_current = self.client.register_script(self.SET_IF_CURRENT)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def _tag(self, tag: str) -> str:
+        return f"{self.prefix}tag:{tag}"
+
+    def _generation(self, tag: str) -> str:
+        return f"{self.prefix}gen:{tag}"
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        if not keys:
+            return []
+        return await self.client.mget([self._key(key) for key in keys])
+
+    async def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str] = (),
+                  generations: Optional[List[int]] = None):
+        if ttl <= 0:
+            return
+        ttl_ms = int(ttl * 1000)
+        if generations is not None:
+            # compared and stored in one script, an invalidation can't slip in between
+            keys = [self._key(key)]
+            for tag in tags:
+                keys += [self._generation(tag), self._tag(tag)]
+            await self._set_if_current(keys=keys, args=[value, ttl_ms, *generations])
+            return
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.set(self._key(key), value, px=ttl_ms)
+            for tag in tags:
+                # the tag set lives as long as its newest entry, entries of one tag share a TTL
+                pipe.sadd(self._tag(tag), self._key(key))
+                pipe.pexpire(self._tag(tag), ttl_ms)
+            await pipe.execute()
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self.client.delete(*(self._key(key) for key in keys))
+
+    async def generations(self, tags: List[str]) -> List[int]:
+        if not tags:
+            return []
+        return [int(generation or 0) for generation in
+                await self.client.mget([self._generation(tag) for tag in tags])]
+
+    async def invalidate_tags(self, *tags: str):
+        for tag in tags:
+            # bumped first, a fill that read the old data and stores after this is skipped
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.incr(self._generation(tag))
+                pipe.pexpire(self._generation(tag), int(GENERATION_TTL * 1000))
+                await pipe.execute()
+            tag_key = self._tag(tag)
+            keys = await self.client.smembers(tag_key)
+            await self.client.delete(tag_key, *keys)
+
+    async def acquire(self, key: str, ttl: float) -> bool:
+        return bool(await self.client.set(self._key(f"lock:{key}"), b"1", nx=True, px=int(ttl * 1000)))
+
+    async def release(self, key: str):
+        await self.client.delete(self._key(f"lock:{key}"))
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class Cache:
+    """Read-through cache with single-flight loading.
+
+    Concurrent misses on one key in this process share a single loader call, across
+    workers the backend's fill lock makes the others poll for the value instead of
+    loading it themselves (for up to CACHE_LOCK_TIMEOUT, then they load anyway).
+    """
+
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, backend: CacheBackend, ttl: float, lock_timeout: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight: Dict[str, "asyncio.Future[bytes]"] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """The cached value if there is one, never loads."""
+        return await self.backend.get(key)
+
+    async def get_or_set(self, key: str, loader: Callable[[], Awaitable[bytes]], ttl: Optional[float] = None,
+                         tags: Iterable[str] = ()) -> bytes:
+        value = await self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._fill(key, loader, self.ttl if ttl is None else ttl, tags)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it, don't warn when there are none
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _fill(self, key: str, loader: Callable[[], Awaitable[bytes]], ttl: float, tags: Iterable[str]) -> bytes:
+        locked = await self.backend.acquire(key, self.lock_timeout)
+        if not locked:
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.POLL_INTERVAL)
+                value = await self.backend.get(key)
+                if value is not None:
+                    self.coalesced += 1
+                    return value
+        tags = list(tags)
+        try:
+            # a write invalidating the tags while the loader runs makes its value stale, don't store it
+            generations = await self.backend.generations(tags)
+            value = await loader()
+            await self.backend.set(key, value, ttl, tags, generations)
+            return value
+        finally:
+            if locked:
+                await self.backend.release(key)
+
+    async def invalidate_tags(self, *tags: str):
+        await self.backend.invalidate_tags(*tags)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend.name, "hits": self.hits, "misses": self.misses,
+                "coalesced": self.coalesced, "inflight": len(self._inflight), **self.backend.stats()}
+
+
+def cache_backend(name: str) -> CacheBackend:
+    if name == "memory":
+        return MemoryCacheBackend(maxsize=config.CACHE_MAX_ENTRIES)
+    if name == "redis":
+        return RedisCacheBackend(config.CACHE_URL, prefix=config.CACHE_PREFIX)
+    if name == "none":
+        return NullCacheBackend()
+    raise ValueError(f"Unknown cache backend: {name}")
+
+
+shared_cache = Cache(cache_backend(config.CACHE_BACKEND), ttl=config.CACHE_TTL, lock_timeout=config.CACHE_LOCK_TIMEOUT)
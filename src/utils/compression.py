@@ -0,0 +1,273 @@
+import asyncio
+import zlib
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.settings import config
+from src.utils.metrics import registry
+
+__all__ = ["Encoder", "GzipEncoder", "BrotliEncoder", "ZstdEncoder", "available_encoders", "negotiate",
+           "CompressionMiddleware"]
+
+compression_bytes = registry.counter("http_compression_bytes_total", "Response bytes before and after compression.",
+                                     ("encoding", "stage"))
+
+# no body to compress, or a byte range that only makes sense against the identity body
+NOT_COMPRESSED_STATUSES = frozenset({204, 206, 304})
+
+
+class Encoder(ABC):
+    """One content coding. `stream()` returns a per response compressor with `chunk` and `finish`."""
+    name: str = ""
+
+    def compress(self, data: bytes) -> bytes:
+        stream = self.stream()
+        return stream.finish(data)
+
+    @abstractmethod
+    def stream(self):
+        ...
+
+
+class _ZlibStream:
+    def __init__(self, level: int):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip container
+
+    def chunk(self, data: bytes) -> bytes:
+        # sync flush, so each chunk of a streamed export reaches the client as it is produced
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_FINISH)
+
+
+class GzipEncoder(Encoder):
+    name = "gzip"
+
+    def __init__(self, level: int):
+        self.level = level
+
+    def stream(self):
+        return _ZlibStream(self.level)
+
+
+class _BrotliStream:
+    def __init__(self, module, quality: int):
+        self._obj = module.Compressor(quality=quality)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._obj.process(data) + self._obj.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._obj.process(data) + self._obj.finish()
+
+
+class BrotliEncoder(Encoder):
+    """Needs the optional brotli (or brotlicffi) package."""
+    name = "br"
+
+    def __init__(self, quality: int):
+        try:
+            import brotli
+        except ImportError:
+            import brotlicffi as brotli
+        self.module = brotli
+        self.quality = quality
+
+    def stream(self):
+        return _BrotliStream(self.module, self.quality)
+
+
+class _ZstdStream:
+    def __init__(self, module, compressor):
+        self._module = module
+        self._obj = compressor.compressobj()
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._obj.compress(data) + self._obj.flush(self._module.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._obj.compress(data) + self._obj.flush()
+
+
+class ZstdEncoder(Encoder):
+    """Needs the optional zstandard package."""
+    name = "zstd"
+
+    def __init__(self, level: int):
+        import zstandard
+
+        self.module = zstandard
+        self.compressor = zstandard.ZstdCompressor(level=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def stream(self):
+        return _ZstdStream(self.module, self.compressor)
+
+
+def available_encoders(names: Iterable[str]) -> Dict[str, Encoder]:
+    """The configured encoders in preference order, codings whose package is missing are skipped."""
+    factories = {
+        "zstd": lambda: ZstdEncoder(config.COMPRESSION_ZSTD_LEVEL),
+        "br": lambda: BrotliEncoder(config.COMPRESSION_BROTLI_QUALITY),
+        "gzip": lambda: GzipEncoder(config.COMPRESSION_GZIP_LEVEL),
+    }
+    encoders = {}
+    for name in names:
+        if name not in factories:
+            raise ValueError(f"Unknown compression encoding: {name}")
+        try:
+            encoders[name] = factories[name]()
+        except ImportError:
+            continue
+    return encoders
+
+
+@lru_cache(maxsize=256)
+def negotiate(accept_encoding: str, offered: Tuple[str, ...]) -> Optional[str]:
+    """Highest q-value coding the client accepts, ties go to the server's order. Cached, clients send
+    the same few header values over and over."""
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            weights[name] = q
+    best, best_q = None, 0.0
+    for name in offered:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class CompressionMiddleware:
+    """Pure ASGI response compression.
+
+    Bodies sent in one message are compressed whole once they reach `minimum_size`, streamed bodies
+    (StreamingResponse, e.g. /users/export) are compressed chunk by chunk. Only content types in the
+    allowlist are touched, already encoded responses pass through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, encoders: Dict[str, Encoder], minimum_size: int,
+                 content_types: Iterable[str], thread_min_size: int = 0):
+        self.app = app
+        self.encoders = encoders
+        self.offered = tuple(encoders)
+        self.minimum_size = minimum_size
+        self.content_types = frozenset(content_types)
+        self.thread_min_size = thread_min_size
+        self._counters = {name: (compression_bytes.labels(name, "in"), compression_bytes.labels(name, "out"))
+                          for name in encoders}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.offered:
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = Headers(scope=scope).get("accept-encoding")
+        encoding = negotiate(accept_encoding, self.offered) if accept_encoding else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressingResponder(self, self.encoders[encoding], send)
+        await self.app(scope, receive, responder.send)
+
+    def compressible(self, headers: MutableHeaders) -> bool:
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+        return content_type in self.content_types
+
+
+class _CompressingResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoder: Encoder, send: Send):
+        self.middleware = middleware
+        self.encoder = encoder
+        self.counter_in, self.counter_out = middleware._counters[encoder.name]
+        self._send = send
+        self.start: Optional[Message] = None
+        self.passthrough = False
+        self.stream = None
+
+    def _encoded_headers(self, headers: MutableHeaders):
+        headers["Content-Encoding"] = self.encoder.name
+        self._varied_headers(headers)
+
+    @staticmethod
+    def _varied_headers(headers: MutableHeaders):
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("etag")
+        # the compressed bytes differ from the identity ones, so the validator can only be weak
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+
+    async def send(self, message: Message):
+        if self.passthrough:
+            await self._send(message)
+            return
+        if message["type"] == "http.response.start":
+            headers = MutableHeaders(raw=message["headers"])
+            if message["status"] == 304:
+                # stands in for the 200 this client would get compressed, so its validator is weak too
+                self._varied_headers(headers)
+            if message["status"] in NOT_COMPRESSED_STATUSES or not self.middleware.compressible(headers):
+                self.passthrough = True
+                await self._send(message)
+            else:
+                self.start = message
+            return
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.stream is None:
+            headers = MutableHeaders(raw=self.start["headers"])
+            if not more_body:
+                await self._send_whole(headers, body)
+                return
+            length = headers.get("content-length")
+            if length is not None and int(length) < self.middleware.minimum_size:
+                self.passthrough = True
+                await self._send(self.start)
+                await self._send(message)
+                return
+            del headers["content-length"]
+            self._encoded_headers(headers)
+            await self._send(self.start)
+            self.stream = self.encoder.stream()
+
+        self.counter_in.inc(len(body))
+        data = self.stream.chunk(body) if more_body else self.stream.finish(body)
+        self.counter_out.inc(len(data))
+        await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    async def _send_whole(self, headers: MutableHeaders, body: bytes):
+        if len(body) < self.middleware.minimum_size:
+            await self._send(self.start)
+            await self._send({"type": "http.response.body", "body": body})
+            return
+        if self.middleware.thread_min_size and len(body) >= self.middleware.thread_min_size:
+            # zlib, brotli and zstd release the GIL, big bodies compress without stalling the event loop
+            data = await asyncio.to_thread(self.encoder.compress, body)
+        else:
+            data = self.encoder.compress(body)
+        self.counter_in.inc(len(body))
+        self.counter_out.inc(len(data))
+        headers["Content-Length"] = str(len(data))
+        self._encoded_headers(headers)
+        await self._send(self.start)
+        await self._send({"type": "http.response.body", "body": data})
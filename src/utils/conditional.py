@@ -0,0 +1,35 @@
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request, Response
+
+from src.utils.responses import FastJSONResponse
+
+__all__ = ["make_etag", "etag_matches", "not_modified", "conditional_response"]
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag over the values that determine a representation, e.g. (id, updated_at)."""
+    digest = hashlib.blake2b("\x1f".join(map(str, parts)).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses the weak comparison, so a W/ prefix sent back by a proxy still matches."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def conditional_response(request: Request, content, etag: str, cache_control: str) -> Response:
+    """304 when the client already holds `etag`, otherwise the JSON body with its validators."""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag, cache_control)
+    return FastJSONResponse(status_code=content.status, content=content,
+                            headers={"ETag": etag, "Cache-Control": cache_control})
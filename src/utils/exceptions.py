@@ -44,4 +44,16 @@ class BadRequestError(GeneralException):
 
     def __init__(self, message: Optional[str] = "Geçersiz İstek Hatası", status: Optional[int] = 400, code: Optional[str] = "BadRequestException",
                  details: Optional[Any] = None, headers: Optional[Dict[str, str]] = None):
-        super().__init__(message, status, code, details, headers)
\ No newline at end of file
+        super().__init__(message, status, code, details, headers)
+
+class ServiceUnavailableError(GeneralException):
+
+    def __init__(self, message: Optional[str] = "Sunucu şu anda meşgul. Lütfen daha sonra tekrar deneyiniz.", status: Optional[int] = 503, code: Optional[str] = "ServiceUnavailableException",
+                 details: Optional[Any] = None, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message, status, code, details, headers)
+
+class TooManyRequestsError(GeneralException):
+
+    def __init__(self, message: Optional[str] = "Çok fazla deneme yapıldı. Lütfen daha sonra tekrar deneyiniz.", status: Optional[int] = 429, code: Optional[str] = "TooManyRequestsException",
+                 details: Optional[Any] = None, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message, status, code, details, headers)
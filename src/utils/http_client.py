@@ -0,0 +1,98 @@
+import asyncio
+import importlib.util
+import random
+import time
+from typing import TYPE_CHECKING, Optional
+
+from src.settings import config
+from src.utils.metrics import registry
+
+if TYPE_CHECKING:
+    import httpx
+
+__all__ = ["HttpClient", "http_client"]
+
+http_client_requests = registry.counter("http_client_requests_total", "Outbound HTTP requests by host and result.",
+                                        ("host", "result"))
+http_client_duration = registry.histogram("http_client_request_duration_seconds", "Outbound HTTP request latency.",
+                                          ("host",))
+
+# safe to send again after a 5xx or a read timeout, POSTs are only retried when the connection failed
+IDEMPOTENT = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = frozenset({502, 503, 504})
+
+
+class HttpClient:
+    """One pooled `httpx.AsyncClient` for every outbound call of the process, so TLS sessions and
+    keep-alive connections are reused instead of set up per request."""
+
+    def __init__(self, retries: int):
+        self.retries = retries
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    def _build(self) -> "httpx.AsyncClient":
+        # httpx (and the trio/anyio backends it probes) is imported with the first outbound call, not at boot
+        import httpx
+
+        http2 = config.HTTP_CLIENT_HTTP2 and importlib.util.find_spec("h2") is not None
+        limits = httpx.Limits(max_connections=config.HTTP_CLIENT_MAX_CONNECTIONS,
+                              max_keepalive_connections=config.HTTP_CLIENT_MAX_KEEPALIVE,
+                              keepalive_expiry=config.HTTP_CLIENT_KEEPALIVE_EXPIRY)
+        return httpx.AsyncClient(
+            http2=http2,
+            limits=limits,
+            timeout=httpx.Timeout(config.HTTP_CLIENT_TIMEOUT, connect=config.HTTP_CLIENT_CONNECT_TIMEOUT),
+            # connect errors are retried by the transport for every method
+            transport=httpx.AsyncHTTPTransport(http2=http2, limits=limits, retries=self.retries),
+        )
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        if self._client is None or self._client.is_closed:
+            self._client = self._build()
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(self, method: str, url: str, **kwargs) -> "httpx.Response":
+        """`httpx.AsyncClient.request` plus jittered retries of idempotent requests on 502/503/504 and
+        read timeouts."""
+        import httpx
+
+        host = httpx.URL(url).host
+        retries = self.retries if method.upper() in IDEMPOTENT else 0
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.TimeoutException:
+                http_client_requests.labels(host, "timeout").inc()
+                if attempt == retries:
+                    raise
+            else:
+                http_client_requests.labels(host, str(response.status_code)).inc()
+                if response.status_code not in RETRY_STATUSES or attempt == retries:
+                    return response
+            finally:
+                http_client_duration.labels(host).observe(time.perf_counter() - start)
+            await asyncio.sleep(random.uniform(0, 0.1 * 2 ** attempt))
+
+    async def get(self, url: str, **kwargs) -> "httpx.Response":
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> "httpx.Response":
+        return await self.request("POST", url, **kwargs)
+
+    def stats(self) -> dict:
+        pool = getattr(self._client, "_transport", None)
+        pool = getattr(pool, "_pool", None)
+        return {
+            "started": self._client is not None,
+            "connections": len(pool.connections) if pool is not None else 0,
+        }
+
+
+http_client = HttpClient(retries=config.HTTP_CLIENT_RETRIES)
@@ -0,0 +1,73 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.utils.metrics import registry
+from src.utils.single_psql_db import track_queries
+
+__all__ = ["MetricsMiddleware"]
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+UNMATCHED_ROUTE = "<unmatched>"
+
+requests_total = registry.counter("http_requests_total", "HTTP requests by route and status.",
+                                  ("method", "route", "status"))
+request_duration = registry.histogram("http_request_duration_seconds", "HTTP request latency.",
+                                      ("method", "route"))
+requests_in_progress = registry.gauge("http_requests_in_progress", "HTTP requests being served.").labels()
+request_db_queries = registry.histogram("http_request_db_queries", "SQL statements per HTTP request.",
+                                        ("method", "route"), buckets=QUERY_COUNT_BUCKETS)
+request_db_duration = registry.histogram("http_request_db_duration_seconds", "SQL time per HTTP request.",
+                                         ("method", "route"))
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency, status and SQL usage per route template.
+
+    Routes are labelled with their template (`/users/{user_id}`), paths that match
+    no route share one label so scanners cannot blow up the series count.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        # (method, route) -> its histograms, saves three label lookups per request
+        self._series = {}
+
+    def _route_series(self, labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = (
+                request_duration.labels(*labels),
+                request_db_queries.labels(*labels),
+                request_db_duration.labels(*labels),
+            )
+        return series
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        queries = track_queries()
+        requests_in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            requests_in_progress.dec()
+            route = scope.get("route")
+            labels = (scope["method"], getattr(route, "path", UNMATCHED_ROUTE))
+            duration, db_queries, db_duration = self._route_series(labels)
+            requests_total.labels(*labels, str(status)).inc()
+            duration.observe(elapsed)
+            db_queries.observe(queries.count)
+            db_duration.observe(queries.duration)
@@ -0,0 +1,117 @@
+import asyncio
+import contextvars
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Iterable, List, Optional, Set, TypeVar
+
+from src.utils.metrics import registry
+
+__all__ = ["BatchLoader"]
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+loader_batch_size = registry.histogram("loader_batch_size", "Distinct keys fetched per loader batch.", ("loader",),
+                                       buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
+loader_keys = registry.counter("loader_keys_total", "Keys asked from a loader, `coalesced` ones joined an already "
+                                                    "pending lookup of the same key.", ("loader", "result"))
+
+
+class _Batch:
+    __slots__ = ("futures", "dispatched", "context")
+
+    def __init__(self):
+        self.futures: Dict[Any, asyncio.Future] = {}
+        self.dispatched = False
+        # of the caller that started the batch, its checkouts and queries count against that request
+        self.context = contextvars.copy_context()
+
+
+class BatchLoader(Generic[K, V]):
+    """DataLoader style batching: `load(key)` calls made on one event loop within `window` seconds are
+    answered by a single `fetch(keys)` call, a key asked several times is fetched once.
+
+    `fetch` gets the distinct keys and returns {key: value}, missing keys load as None. It runs in its
+    own task, so it must not use the caller's session, in a copy of the context of the caller that
+    started the batch. Values are shared between callers, treat them as read-only.
+    """
+
+    def __init__(self, name: str, fetch: Callable[[List[K]], Awaitable[Dict[K, V]]], max_batch_size: int,
+                 window: float = 0.0):
+        self.name = name
+        self.fetch = fetch
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self.batches = 0
+        self.keys = 0
+        self.coalesced = 0
+        self._pending: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _Batch]" = weakref.WeakKeyDictionary()
+        self._tasks: Set[asyncio.Task] = set()
+        self._batch_size = loader_batch_size.labels(name)
+        self._loaded, self._coalesced = loader_keys.labels(name, "loaded"), loader_keys.labels(name, "coalesced")
+
+    async def load(self, key: K) -> Optional[V]:
+        # shielded, a cancelled caller must not cancel the lookup other callers are waiting on
+        return await asyncio.shield(self._future(key))
+
+    async def load_many(self, keys: Iterable[K]) -> Dict[K, V]:
+        """Found values of `keys`, joined to the pending batch like individual `load` calls."""
+        futures = {key: self._future(key) for key in keys}
+        if futures:
+            await asyncio.shield(asyncio.gather(*futures.values()))
+        return {key: future.result() for key, future in futures.items() if future.result() is not None}
+
+    def _future(self, key: K) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        batch = self._pending.get(loop)
+        if batch is None:
+            batch = self._pending[loop] = _Batch()
+            if self.window > 0:
+                loop.call_later(self.window, self._dispatch, loop, batch)
+            else:
+                loop.call_soon(self._dispatch, loop, batch)
+        future = batch.futures.get(key)
+        if future is not None:
+            self.coalesced += 1
+            self._coalesced.inc()
+            return future
+        future = batch.futures[key] = loop.create_future()
+        self.keys += 1
+        self._loaded.inc()
+        if len(batch.futures) >= self.max_batch_size:
+            self._dispatch(loop, batch)
+        return future
+
+    def _dispatch(self, loop: asyncio.AbstractEventLoop, batch: _Batch):
+        if batch.dispatched:
+            return
+        batch.dispatched = True
+        if self._pending.get(loop) is batch:
+            del self._pending[loop]
+        task = loop.create_task(self._run(batch), context=batch.context)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: _Batch):
+        keys = list(batch.futures)
+        self.batches += 1
+        self._batch_size.observe(len(keys))
+        try:
+            found = await self.fetch(keys)
+        except asyncio.CancelledError:
+            for future in batch.futures.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in batch.futures.values():
+                if not future.done():
+                    future.set_exception(e)
+                    future.exception()  # waiters re-raise it, don't warn when there are none
+            return
+        for key, future in batch.futures.items():
+            if not future.done():
+                future.set_result(found.get(key))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"batches": self.batches, "keys": self.keys, "coalesced": self.coalesced,
+                "avg_batch_size": self.keys / self.batches if self.batches else 0.0,
+                "inflight_batches": len(self._tasks)}
@@ -0,0 +1,37 @@
+import asyncio
+import logging
+import smtplib
+from email.message import EmailMessage
+
+from src.settings import config
+
+__all__ = ["send_mail"]
+
+logger = logging.getLogger("src.mail")
+
+
+def _send(message: EmailMessage):
+    with smtplib.SMTP(config.SMTP_HOST, config.SMTP_PORT, timeout=30) as smtp:
+        if config.SMTP_STARTTLS:
+            smtp.starttls()
+        if config.SMTP_USER:
+            smtp.login(config.SMTP_USER, config.SMTP_PASSWORD)
+        smtp.send_message(message)
+
+
+async def send_mail(to: str, subject: str, body: str):
+    """Sends a plain text mail, meant to be called from a background job, never from a request.
+
+    Without DEF_SMTP_HOST the mail is not sent, only its recipient and subject are logged: bodies
+    carry live links (password resets) that must not end up in the logs.
+    """
+    message = EmailMessage()
+    message["From"] = config.MAIL_FROM
+    message["To"] = to
+    message["Subject"] = subject
+    message.set_content(body)
+    if not config.SMTP_HOST:
+        logger.info("mail to %s not sent, no SMTP host: %s", to, subject)
+        return
+    # smtplib blocks, keep it off the event loop
+    await asyncio.to_thread(_send, message)
@@ -1,12 +1,31 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional
+from uuid import UUID
+
 from src.utils.schemas import PaginationInfo
+from src.utils.exceptions import BadRequestError
 
-__all__ = ["get_pagination_info"]
+__all__ = ["get_pagination_info", "encode_cursor", "decode_cursor"]
 
-def get_pagination_info(total_items: int, current_page: int, page_size: int):
+def get_pagination_info(total_items: Optional[int], current_page: int, page_size: int,
+                        has_next: Optional[bool] = None, current_page_size: Optional[int] = None,
+                        estimated: bool = False):
+    if total_items is None:
+        return PaginationInfo(
+            currentPage=current_page,
+            currentPageSize=current_page_size or 0,
+            hasNext=bool(has_next),
+            hasPrevious=current_page > 1,
+            pageSize=page_size,
+        )
     total_pages = (total_items + page_size - 1) // page_size
     has_previous = current_page > 1
     has_next = current_page < total_pages
-    current_page_size = page_size if current_page != total_pages else total_items - (total_pages - 1) * page_size
+    if current_page_size is None:
+        # past the last page there are no items
+        current_page_size = max(0, min(page_size, total_items - (current_page - 1) * page_size))
 
     return PaginationInfo(
         currentPage=current_page,
@@ -16,5 +35,22 @@ def get_pagination_info(total_items: int, current_page: int, page_size: int):
         pageCount=total_pages,
         pageSize=page_size,
         remainingPages=max(0, total_pages - current_page),
-        totalItems=total_items
+        totalItems=total_items,
+        totalIsEstimate=estimated,
     )
+
+
+def encode_cursor(*values: Any) -> str:
+    """Opaque keyset cursor, the sort key of the row it points at."""
+    plain = [v.isoformat() if isinstance(v, datetime) else str(v) if isinstance(v, UUID) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(plain, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise BadRequestError("Geçersiz sayfa imleci.")
+    if not isinstance(values, list) or len(values) != size:
+        raise BadRequestError("Geçersiz sayfa imleci.")
+    return values
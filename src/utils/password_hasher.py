@@ -0,0 +1,110 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional
+
+from passlib.context import CryptContext
+
+from src.settings import config
+from src.utils.exceptions import ServiceUnavailableError
+from src.utils.metrics import registry
+
+__all__ = ["PasswordHasher", "password_hasher"]
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+hash_duration = registry.histogram("password_hash_duration_seconds", "bcrypt hash and verify time, queueing included.",
+                                   ("operation",))
+
+
+# module level so they can be pickled into a process pool
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    """Runs bcrypt off the event loop on a bounded pool.
+
+    At most `workers + queue_size` calls are admitted at once; anything beyond
+    that is rejected immediately with a 503 instead of queueing behind seconds
+    of bcrypt work.
+    """
+
+    def __init__(self, executor: str = "thread", workers: int = 4, queue_size: int = 64, retry_after: int = 1):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown password hash executor: {executor}")
+        self.executor_kind = executor
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.rejected = 0
+        self.latency = {operation: hash_duration.labels(operation) for operation in ("hash", "verify")}
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hasher")
+        return self._executor
+
+    async def _run(self, operation: str, fn, *args, admit: bool = True):
+        if admit and self.in_flight >= self.capacity:
+            self.rejected += 1
+            raise ServiceUnavailableError(headers={"Retry-After": str(self.retry_after)})
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.latency[operation].observe(time.perf_counter() - start)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", _hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", _verify, plain_password, hashed_password)
+
+    async def hash_many(self, passwords: List[str]) -> List[str]:
+        """Hashes a batch using at most `workers` slots at a time.
+
+        Batches wait for a free worker instead of being rejected, interactive
+        calls still see them in `in_flight` and get back-pressure first.
+        """
+        slots = asyncio.Semaphore(self.workers)
+
+        async def hash_one(password: str) -> str:
+            async with slots:
+                return await self._run("hash", _hash, password, admit=False)
+
+        return list(await asyncio.gather(*(hash_one(password) for password in passwords)))
+
+    def stats(self) -> dict:
+        return {
+            "executor": self.executor_kind,
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+            "latency": {name: histogram.snapshot() for name, histogram in self.latency.items()},
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    executor=config.PASSWORD_HASH_EXECUTOR,
+    workers=config.PASSWORD_HASH_WORKERS,
+    queue_size=config.PASSWORD_HASH_QUEUE_SIZE,
+    retry_after=config.PASSWORD_HASH_RETRY_AFTER,
+)
@@ -0,0 +1,92 @@
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.settings import config
+from src.utils.metrics import registry
+from src.utils.single_psql_db import current_queries
+
+__all__ = ["QueryBudgetExceeded", "install_query_detector", "query_budget"]
+
+logger = logging.getLogger("src.sql")
+
+EXPLAIN_PREFIXES = {"postgresql": "EXPLAIN ", "sqlite": "EXPLAIN QUERY PLAN "}
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+slow_queries = registry.counter("db_slow_queries_total", "Statements slower than SQL_SLOW_QUERY_MS.").labels()
+repeated_statements = registry.counter("db_repeated_statements_total",
+                                       "Statements repeated SQL_REPEATED_QUERY_THRESHOLD times in one request.").labels()
+budget_overruns = registry.counter("db_query_budget_overruns_total", "Requests that went over their query budget.").labels()
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def explain(conn, statement: str, parameters) -> Optional[str]:
+    """Plan of an already executed statement, run on a raw DBAPI cursor so it skips the engine events.
+
+    The cursor shares the request's connection and transaction, so EXPLAIN runs inside a savepoint: a
+    failing EXPLAIN is rolled back to it instead of aborting the request's transaction (postgres).
+    """
+    prefix = EXPLAIN_PREFIXES.get(conn.dialect.name)
+    if prefix is None or not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT query_detector_explain")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return "\n".join(str(row[-1] if conn.dialect.name == "sqlite" else row[0]) for row in cursor.fetchall())
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT query_detector_explain")
+            return f"EXPLAIN failed: {e}"
+        finally:
+            cursor.execute("RELEASE SAVEPOINT query_detector_explain")
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    finally:
+        cursor.close()
+
+
+def _inspect_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started_at
+    if config.SQL_SLOW_QUERY_MS and elapsed * 1000 >= config.SQL_SLOW_QUERY_MS:
+        slow_queries.inc()
+        plan = None if executemany else explain(conn, statement, parameters)
+        logger.warning("slow query (%.1f ms): %s\n%s", elapsed * 1000, statement, plan or "no plan")
+
+    queries = current_queries()
+    if config.SQL_REPEATED_QUERY_THRESHOLD:
+        seen = queries.statements[statement] = queries.statements.get(statement, 0) + 1
+        if seen == config.SQL_REPEATED_QUERY_THRESHOLD:
+            repeated_statements.inc()
+            logger.warning("statement repeated %d times in one request, likely N+1: %s", seen, statement)
+
+    budget = queries.budget if queries.budget is not None else config.SQL_QUERY_BUDGET
+    if budget and queries.count > budget:
+        message = f"query budget of {budget} exceeded by statement #{queries.count}: {statement}"
+        if queries.count == budget + 1:
+            budget_overruns.inc()
+            logger.warning(message)
+        if config.SQL_QUERY_BUDGET_ENFORCE:
+            raise QueryBudgetExceeded(message)
+
+
+def install_query_detector():
+    """Hooks the detector into every engine, runs after the counting listener in single_psql_db."""
+    if not event.contains(Engine, "after_cursor_execute", _inspect_query):
+        event.listen(Engine, "after_cursor_execute", _inspect_query)
+
+
+def query_budget(limit: int):
+    """Route dependency capping the statements one request may issue, e.g.
+    `dependencies=[Depends(query_budget(3))]`."""
+
+    async def set_query_budget():
+        current_queries().budget = limit
+
+    return set_query_budget
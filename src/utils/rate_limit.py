@@ -0,0 +1,162 @@
+import math
+import time
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
+
+from fastapi import Request
+
+from src.settings import config
+from src.utils.cache import TTLCache
+from src.utils.exceptions import TooManyRequestsError
+from src.utils.metrics import registry
+
+__all__ = ["RateLimitBackend", "MemoryRateLimitBackend", "RedisRateLimitBackend", "RateLimiter", "parse_rate",
+           "client_ip", "rate_limit_backend"]
+
+rate_limit_decisions = registry.counter("rate_limit_decisions_total", "Rate limiter decisions by limiter and rule.",
+                                        ("limiter", "rule", "result"))
+
+
+def parse_rate(rate: str) -> Optional[Tuple[int, float]]:
+    """"20/60" -> 20 requests per 60 seconds, an empty or zero rate disables the rule."""
+    if not rate:
+        return None
+    limit, _, window = rate.partition("/")
+    limit, window = int(limit), float(window or 1)
+    if limit <= 0 or window <= 0:
+        return None
+    return limit, window
+
+
+def client_ip(request: Request) -> str:
+    if config.RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+class RateLimitBackend(ABC):
+    """Token buckets holding `limit` tokens that refill over `window` seconds."""
+    name: str = ""
+
+    @abstractmethod
+    async def hit(self, key: str, limit: int, window: float) -> float:
+        """Takes a token, returns 0 when allowed or the seconds until the next token."""
+
+    @abstractmethod
+    async def reset(self, key: str):
+        ...
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Per process buckets, with N workers a client effectively gets N times the limit."""
+    name = "memory"
+
+    def __init__(self, maxsize: int):
+        # an idle bucket is full again after `window`, so it can simply expire
+        self.buckets = TTLCache(maxsize=maxsize, ttl=0)
+
+    async def hit(self, key: str, limit: int, window: float) -> float:
+        now = time.monotonic()
+        rate = limit / window
+        tokens, updated_at = self.buckets.get(key) or (limit, now)
+        tokens = min(limit, tokens + (now - updated_at) * rate)
+        retry_after = 0.0
+        if tokens < 1:
+            retry_after = (1 - tokens) / rate
+        else:
+            tokens -= 1
+        self.buckets.set(key, (tokens, now), ttl=window)
+        return retry_after
+
+    async def reset(self, key: str):
+        self.buckets.delete(key)
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Buckets shared by every worker, updated atomically by a Lua script. Needs the `redis` extra."""
+    name = "redis"
+
+    SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+local rate = limit / window
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or limit
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(limit, tokens + math.max(0, now - ts) * rate)
+local retry_after = 0
+if tokens < 1 then
+    retry_after = math.ceil((1 - tokens) / rate)
+else
+    tokens = tokens - 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], window)
+return retry_after
+"""
+
+    def __init__(self, url: str, prefix: str = ""):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis needs the redis extra, poetry install -E redis") from e
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._script = self.client.register_script(self.SCRIPT)
+
+    async def hit(self, key: str, limit: int, window: float) -> float:
+        retry_after_ms = await self._script(keys=[f"{self.prefix}{key}"], args=[limit, int(window * 1000)])
+        return int(retry_after_ms) / 1000
+
+    async def reset(self, key: str):
+        await self.client.delete(f"{self.prefix}{key}")
+
+
+class RateLimiter:
+    """Named set of rules checked in order, each keyed by client ip or by a caller supplied key
+    (e.g. the login identifier). Call `check` before doing any DB or hashing work."""
+
+    def __init__(self, name: str, backend: RateLimitBackend, per_ip: str = "", per_key: str = ""):
+        self.name = name
+        self.backend = backend
+        self.per_ip = parse_rate(per_ip)
+        self.per_key = parse_rate(per_key)
+
+    def _key_bucket(self, key: str) -> str:
+        return f"rl:{self.name}:key:{key.lower()}"
+
+    async def _take(self, rule: str, bucket: str, rate: Tuple[int, float]) -> float:
+        retry_after = await self.backend.hit(bucket, *rate)
+        rate_limit_decisions.labels(self.name, rule, "limited" if retry_after else "allowed").inc()
+        return retry_after
+
+    async def check(self, request: Request, key: Optional[str] = None):
+        if not config.RATE_LIMIT_ENABLED:
+            return
+        retry_after = 0.0
+        if self.per_ip:
+            retry_after = await self._take("ip", f"rl:{self.name}:ip:{client_ip(request)}", self.per_ip)
+        if not retry_after and self.per_key and key:
+            retry_after = await self._take("key", self._key_bucket(key), self.per_key)
+        if retry_after:
+            raise TooManyRequestsError(headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+    async def reset(self, key: str):
+        """Refills the caller key's bucket, e.g. after a successful login."""
+        if self.per_key and config.RATE_LIMIT_ENABLED:
+            await self.backend.reset(self._key_bucket(key))
+
+
+def build_backend(name: str) -> RateLimitBackend:
+    if name == "memory":
+        return MemoryRateLimitBackend(maxsize=config.RATE_LIMIT_MAX_KEYS)
+    if name == "redis":
+        return RedisRateLimitBackend(config.CACHE_URL, prefix=config.CACHE_PREFIX)
+    raise ValueError(f"Unknown rate limit backend: {name}")
+
+
+rate_limit_backend = build_backend(config.RATE_LIMIT_BACKEND)
@@ -0,0 +1,21 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+__all__ = ["FastJSONResponse"]
+
+
+class FastJSONResponse(JSONResponse):
+    """Serializes straight to bytes with pydantic-core.
+
+    Models, e.g. GeneralResponse / ListView, go through their own compiled
+    serializer instead of model_dump() + stdlib json; anything else goes
+    through pydantic-core's generic encoder.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.__pydantic_serializer__.to_json(content)
+        return to_json(content)
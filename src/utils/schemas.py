@@ -38,15 +38,18 @@ class PaginationInfo(BaseModel):
     currentPageSize: int
     hasNext: bool
     hasPrevious: bool
-    pageCount: int
+    pageCount: typing.Optional[int] = None
     pageSize: int
-    remainingPages: int
-    totalItems: int
+    remainingPages: typing.Optional[int] = None
+    totalItems: typing.Optional[int] = None  # None when the listing was asked with count=none
+    totalIsEstimate: bool = False
 
 
 class ListView(BaseModel, typing.Generic[T], extra=Extra.allow):
     info: typing.Optional[PaginationInfo] = None
     items: typing.List[T]
+    nextCursor: typing.Optional[str] = None
+    prevCursor: typing.Optional[str] = None
 
 
 class PaginationGet(BaseModel):
@@ -55,6 +58,26 @@ class PaginationGet(BaseModel):
     paginate: typing.Optional[bool] = True
     search: typing.Optional[str] = None
     order: typing.Optional[bool] = None
+    count: typing.Optional[typing.Literal["exact", "estimate", "none"]] = "exact"
+    keyset: typing.Optional[bool] = False  # cursor pagination, also implied by after/before
+    after: typing.Optional[str] = None
+    before: typing.Optional[str] = None
+    fields: typing.Optional[str] = None  # sparse fieldset, comma separated item fields, e.g. "id,email"
+
+    @property
+    def is_keyset(self) -> bool:
+        return bool(self.keyset or self.after or self.before)
+
+    @property
+    def field_names(self) -> typing.Optional[typing.Set[str]]:
+        return set(self.fields.split(",")) if self.fields else None
+
+    @field_validator('fields')
+    def fields_validator(cls, v):
+        # one spelling per fieldset, "email, id" and "id,email" share a cache entry and ETag
+        if v is None:
+            return v
+        return ",".join(sorted({name.strip() for name in v.split(",") if name.strip()})) or None
 
     @field_validator('page')
     def page_validator(cls, v):
@@ -0,0 +1,57 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Sequence
+
+from sqlalchemy import func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.settings import config
+
+__all__ = ["SearchBackend", "LikeSearchBackend", "TrigramSearchBackend", "get_search_backend"]
+
+
+def like_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class SearchBackend(ABC):
+    """Turns `PaginationGet.search` into a where clause and an optional ranking expression."""
+    name: str = ""
+
+    @abstractmethod
+    def filter(self, columns: Sequence, term: str):
+        ...
+
+    def rank(self, columns: Sequence, term: str):
+        return None
+
+
+class LikeSearchBackend(SearchBackend):
+    """Portable case insensitive substring match, used on sqlite test databases."""
+    name = "like"
+
+    def filter(self, columns: Sequence, term: str):
+        pattern = like_pattern(term)
+        return or_(*(column.ilike(pattern, escape="\\") for column in columns))
+
+
+class TrigramSearchBackend(LikeSearchBackend):
+    """pg_trgm backend, the ILIKE filter is served by the gin_trgm_ops indexes and
+    results are ranked by the best trigram similarity across the searched columns."""
+    name = "trigram"
+
+    def rank(self, columns: Sequence, term: str):
+        return func.greatest(*(func.similarity(column, term) for column in columns))
+
+
+SEARCH_BACKENDS: Dict[str, SearchBackend] = {
+    LikeSearchBackend.name: LikeSearchBackend(),
+    TrigramSearchBackend.name: TrigramSearchBackend(),
+}
+
+
+def get_search_backend(db: AsyncSession, name: Optional[str] = None) -> SearchBackend:
+    name = name or config.SEARCH_BACKEND
+    if name == "auto":
+        name = "trigram" if db.get_bind().dialect.name == "postgresql" else "like"
+    return SEARCH_BACKENDS[name]
@@ -1,16 +1,218 @@
+import asyncio
 import contextlib
+import itertools
+import json
+import time
+from contextvars import ContextVar
 
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
+from sqlalchemy.orm import DeclarativeBase, Session
 from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.pool import Pool, AsyncAdaptedQueuePool
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
 from datetime import datetime
-from typing import Optional
-from sqlalchemy import select, func
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import select, func, event, text, insert, update, delete, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.dml import UpdateBase
 
 from src.settings import config
+from src.utils.metrics import registry
 
-engine = create_async_engine(config.sql_uri)
-SessionLocal = async_sessionmaker(bind=engine)
+ALEMBIC_ROOT = Path(__file__).resolve().parents[2]
+
+DB_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 30.0)
+
+pool_wait_time = registry.histogram("db_pool_wait_seconds", "Time spent waiting for a pooled connection.",
+                                    buckets=DB_BUCKETS).labels()
+pool_timeouts = registry.counter("db_pool_timeouts_total", "Connection checkouts that hit pool_timeout.").labels()
+pool_connections = registry.gauge("db_pool_connections", "Pooled connections by state.", ("state",))
+db_queries = registry.counter("db_queries_total", "SQL statements executed.").labels()
+db_query_duration = registry.histogram("db_query_duration_seconds", "SQL statement execution time.",
+                                       buckets=DB_BUCKETS).labels()
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a free connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_timeouts.inc()
+            raise
+        finally:
+            pool_wait_time.observe(time.perf_counter() - start)
+
+def engine_options(uri: str) -> dict:
+    url = make_url(uri)
+    if url.get_backend_name() == "sqlite":
+        return {}
+    options = dict(
+        poolclass=TimedQueuePool,
+        pool_size=config.SQL_POOL_SIZE,
+        max_overflow=config.SQL_MAX_OVERFLOW,
+        pool_timeout=config.SQL_POOL_TIMEOUT,
+        pool_recycle=config.SQL_POOL_RECYCLE,
+        pool_pre_ping=config.SQL_POOL_PRE_PING,
+    )
+    if url.get_driver_name() == "asyncpg":
+        server_settings = {}
+        if config.SQL_STATEMENT_TIMEOUT:
+            server_settings["statement_timeout"] = str(config.SQL_STATEMENT_TIMEOUT)
+        options["connect_args"] = {
+            "prepared_statement_cache_size": config.SQL_STATEMENT_CACHE_SIZE,
+            "server_settings": server_settings,
+        }
+    return options
+
+_engine: Optional[AsyncEngine] = None
+
+def get_engine() -> AsyncEngine:
+    """The primary engine, built on first use: importing the app builds no engine and opens no connection.
+    (asyncpg itself is imported by the user models and service, for its exception types.)"""
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(config.sql_uri, **engine_options(config.sql_uri))
+    return _engine
+
+async def dispose_engine():
+    if _engine is not None:
+        await _engine.dispose()
+
+def __getattr__(name: str):
+    # `from src.utils.single_psql_db import engine` (or `replicas`) keeps working, it builds it at that point
+    if name == "engine":
+        return get_engine()
+    if name == "replicas":
+        return get_replicas()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+class Replica:
+    """A read replica engine, `in_use` feeds the least_connections policy."""
+
+    def __init__(self, uri: str):
+        self.name = make_url(uri).render_as_string(hide_password=True)
+        self.engine = create_async_engine(uri, **engine_options(uri))
+        self.in_use = 0
+        self.healthy = True
+        self.last_error: Optional[str] = None
+        event.listen(self.engine.sync_engine, "checkout", self._checkout)
+        event.listen(self.engine.sync_engine, "checkin", self._checkin)
+        event.listen(self.engine.sync_engine, "handle_error", self._handle_error)
+
+    def _checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.in_use += 1
+
+    def _checkin(self, dbapi_connection, connection_record):
+        self.in_use -= 1
+
+    def _handle_error(self, context):
+        # lost connections take the replica out of rotation until the next health check passes
+        if context.is_disconnect:
+            self.mark_down(str(context.original_exception))
+
+    def mark_up(self):
+        self.healthy, self.last_error = True, None
+
+    def mark_down(self, error: str):
+        self.healthy, self.last_error = False, error
+
+    async def check(self):
+        async with self.engine.connect() as conn:
+            if conn.dialect.name == "postgresql" and config.SQL_REPLICA_MAX_LAG:
+                lag = await conn.scalar(text(
+                    "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"))
+                if lag > config.SQL_REPLICA_MAX_LAG:
+                    raise RuntimeError(f"replication lag {lag:.1f}s")
+            else:
+                await conn.execute(text("SELECT 1"))
+
+    def stats(self) -> dict:
+        return {"name": self.name, "healthy": self.healthy, "in_use": self.in_use, "last_error": self.last_error}
+
+class ReplicaSet:
+    """Read replicas behind a routing policy, an empty set routes every read to the primary."""
+    POLICIES = ("round_robin", "least_connections")
+
+    def __init__(self, uris: List[str], policy: str = "round_robin"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown replica policy: {policy}")
+        self.policy = policy
+        self.replicas = [Replica(uri) for uri in uris]
+        self._turn = itertools.count()
+        self._monitor: Optional[asyncio.Task] = None
+
+    def choose(self) -> Optional[Replica]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if self.policy == "least_connections":
+            return min(healthy, key=lambda replica: replica.in_use)
+        return healthy[next(self._turn) % len(healthy)]
+
+    async def check(self):
+        for replica in self.replicas:
+            try:
+                await asyncio.wait_for(replica.check(), timeout=config.SQL_REPLICA_HEALTH_TIMEOUT)
+                replica.mark_up()
+            except Exception as e:
+                replica.mark_down(repr(e))
+
+    async def _monitor_loop(self, interval: float):
+        while True:
+            await self.check()
+            await asyncio.sleep(interval)
+
+    def start_monitor(self, interval: float):
+        if self.replicas and self._monitor is None:
+            self._monitor = asyncio.create_task(self._monitor_loop(interval))
+
+    async def dispose(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def stats(self) -> dict:
+        return {"policy": self.policy, "replicas": [replica.stats() for replica in self.replicas]}
+
+_replicas: Optional[ReplicaSet] = None
+
+def get_replicas() -> ReplicaSet:
+    """The configured read replicas, built on first use like the primary engine."""
+    global _replicas
+    if _replicas is None:
+        _replicas = ReplicaSet(config.SQL_REPLICA_URIS, config.SQL_REPLICA_POLICY)
+    return _replicas
+
+async def dispose_replicas():
+    if _replicas is not None:
+        await _replicas.dispose()
+
+class RoutingSession(Session):
+    """Sends reads marked with `execution_options(replica=True)` (or `bind_arguments={"replica": True}`)
+    to a replica. Writes, unmarked statements and every read after the session's first write go to the
+    primary, so a request always sees its own writes."""
+
+    def get_bind(self, mapper=None, *, clause=None, replica: bool = False, **kw):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info["wrote"] = True
+        elif not self.info.get("wrote"):
+            if replica or (isinstance(clause, Executable) and clause.get_execution_options().get("replica")):
+                chosen = get_replicas().choose()
+                if chosen is not None:
+                    return chosen.engine.sync_engine
+        if self.bind is None:
+            return get_engine().sync_engine
+        return super().get_bind(mapper, clause=clause, **kw)
+
+# unbound, RoutingSession resolves the primary engine lazily
+SessionLocal = async_sessionmaker(expire_on_commit=False, sync_session_class=RoutingSession)
 
 class Base(DeclarativeBase):
     created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
@@ -20,13 +222,67 @@ class Base(DeclarativeBase):
         return f"<{self.__class__.__name__} {self.__dict__}>"
 
     @classmethod
-    async def get_count(cls, where_query: Optional[str] = None):
-        async with get_db() as db:
+    async def get_count(cls, db: AsyncSession, where_query: Optional[str] = None):
+        if where_query is None:
+            query = select(func.count()).select_from(cls)
+        else:
+            query = select(func.count()).select_from(cls).where(where_query)
+        return await db.scalar(query.execution_options(replica=True))
+
+    @classmethod
+    async def estimate_count(cls, db: AsyncSession, where_query: Optional[str] = None) -> Tuple[int, bool]:
+        """Planner row estimate on postgres, falls back to an exact count below COUNT_ESTIMATE_THRESHOLD.
+
+        Returns the count and whether it is an estimate.
+        """
+        connection = await db.connection(bind_arguments={"replica": True})
+        if connection.dialect.name == "postgresql":
             if where_query is None:
-                query = select(func.count()).select_from(cls)
+                estimate = await connection.scalar(
+                    text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+                    {"table": cls.__table__.fullname},
+                )
             else:
-                query = select(func.count()).select_from(cls).where(where_query)
-            return await db.scalar(query)
+                query = select(*cls.__table__.primary_key.columns).where(where_query)
+                compiled = query.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True})
+                result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}")
+                plan = result.scalar()
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                estimate = int(plan[0]["Plan"]["Plan Rows"])
+            if estimate is not None and estimate >= config.COUNT_ESTIMATE_THRESHOLD:
+                return estimate, True
+        return await cls.get_count(db, where_query), False
+
+    @classmethod
+    async def get_many(cls, db: AsyncSession, column, values: List) -> list:
+        """Rows whose `column` is one of `values`, read from a replica. On postgres the values go as one
+        array parameter (`= ANY(:values)`), so the statement text is the same for any number of keys."""
+        if not values:
+            return []
+        if db.get_bind().dialect.name == "postgresql":
+            condition = column == any_(bindparam("values", values, type_=ARRAY(column.type)))
+        else:
+            condition = column.in_(values)
+        stmt = select(cls).where(condition).execution_options(replica=True)
+        return list((await db.scalars(stmt)).all())
+
+    # single statement writes, one round-trip each instead of SELECT + flush + refresh
+    @classmethod
+    async def insert_returning(cls, db: AsyncSession, values: dict):
+        stmt = insert(cls).values(**values).returning(cls)
+        return await db.scalar(stmt)
+
+    @classmethod
+    async def update_returning(cls, db: AsyncSession, where_query, values: dict):
+        # "fetch" refreshes an instance already in the session from the RETURNING row, no extra SELECT
+        stmt = (update(cls).where(where_query).values(**values).returning(cls)
+                .execution_options(populate_existing=True, synchronize_session="fetch"))
+        return await db.scalar(stmt)
+
+    @classmethod
+    async def delete_returning(cls, db: AsyncSession, where_query):
+        stmt = delete(cls).where(where_query).returning(cls).execution_options(synchronize_session="fetch")
+        return await db.scalar(stmt)
 
 @contextlib.asynccontextmanager
 async def get_db() -> AsyncSession:
@@ -39,7 +295,179 @@ async def get_db() -> AsyncSession:
     finally:
         await db.close()
 
-async def init_psql_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-        print("psql db created.")
+# connection checkouts of the current request, set by get_session
+_request_checkouts: ContextVar[Optional[List[int]]] = ContextVar("request_checkouts", default=None)
+
+@event.listens_for(Pool, "checkout")
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    checkouts = _request_checkouts.get()
+    if checkouts is not None:
+        checkouts[0] += 1
+
+def checkout_count() -> int:
+    """Connections checked out from the pool by the current request so far."""
+    checkouts = _request_checkouts.get()
+    return checkouts[0] if checkouts is not None else 0
+
+class QueryLog:
+    """SQL statements issued by one request, `statements` and `budget` are used by the query detector."""
+    __slots__ = ("count", "duration", "statements", "budget")
+
+    def __init__(self):
+        self.count: int = 0
+        self.duration: float = 0.0
+        self.statements: Dict[str, int] = {}
+        self.budget: Optional[int] = None
+
+_request_queries: ContextVar[Optional[QueryLog]] = ContextVar("request_queries", default=None)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    context._query_started_at = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started_at
+    db_queries.inc()
+    db_query_duration.observe(elapsed)
+    queries = _request_queries.get()
+    if queries is not None:
+        queries.count += 1
+        queries.duration += elapsed
+
+def track_queries() -> QueryLog:
+    """Starts a fresh query log for the current context."""
+    queries = QueryLog()
+    _request_queries.set(queries)
+    return queries
+
+def current_queries() -> QueryLog:
+    """Query log of the current context, started on first use."""
+    queries = _request_queries.get()
+    return queries if queries is not None else track_queries()
+
+async def get_session() -> AsyncIterator[AsyncSession]:
+    """Request scoped session, FastAPI caches it so every dependency of a request shares it."""
+    _request_checkouts.set([0])
+    current_queries()
+    async with SessionLocal() as db:
+        try:
+            yield db
+        except:
+            await db.rollback()
+            raise
+
+async def commit(db: AsyncSession):
+    """Commits the unit of work, or only flushes it when an `atomic` block owns the transaction."""
+    if db.info.get("atomic"):
+        await db.flush()
+    else:
+        await db.commit()
+
+@contextlib.asynccontextmanager
+async def atomic(db: AsyncSession) -> AsyncIterator[AsyncSession]:
+    """Groups several model writes into one transaction, committed when the block exits."""
+    if db.info.get("atomic"):
+        yield db
+        return
+    db.info["atomic"] = True
+    try:
+        yield db
+        await db.commit()
+    except:
+        await db.rollback()
+        db.info.pop("after_commit", None)
+        raise
+    finally:
+        db.info.pop("atomic", None)
+    for callback, args in db.info.pop("after_commit", ()):
+        await callback(*args)
+
+async def after_commit(db: AsyncSession, callback: Callable[..., Awaitable[None]], *args):
+    """Runs `callback(*args)` once the writes are committed: right away after `commit`, or when the
+    enclosing `atomic` block commits (never, if it rolls back). For cache invalidation, so no reader
+    refills a cache from the pre-commit state."""
+    if db.info.get("atomic"):
+        db.info.setdefault("after_commit", []).append((callback, args))
+    else:
+        await callback(*args)
+
+def pool_stats() -> dict:
+    if _engine is None:
+        return {"pool": None, "read_replicas": get_replicas().stats()}
+    pool = _engine.pool
+    stats = {"pool": type(pool).__name__, "timeouts": int(pool_timeouts.value), "wait_time": pool_wait_time.snapshot(),
+             "read_replicas": get_replicas().stats()}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=config.SQL_MAX_OVERFLOW,
+        )
+    return stats
+
+@registry.collector
+def _collect_pool_connections():
+    pool = _engine.pool if _engine is not None else None
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        pool_connections.labels("checked_in").set(pool.checkedin())
+        pool_connections.labels("checked_out").set(pool.checkedout())
+        pool_connections.labels("overflow").set(max(pool.overflow(), 0))
+
+class SchemaMismatchError(RuntimeError):
+    pass
+
+def _alembic_config():
+    from alembic.config import Config
+
+    alembic_cfg = Config(str(ALEMBIC_ROOT / "alembic.ini"))
+    alembic_cfg.set_main_option("script_location", str(ALEMBIC_ROOT / "alembic"))
+    return alembic_cfg
+
+def _upgrade_head(connection):
+    from alembic import command
+
+    # env.py migrates on the connection it is handed and leaves the app's logging alone
+    alembic_cfg = _alembic_config()
+    alembic_cfg.attributes.update(connection=connection, configure_logger=False)
+    command.upgrade(alembic_cfg, "head")
+
+async def verify_schema():
+    """Fails fast when the database is not at the migration head this code was written for."""
+    # alembic is only imported in this mode, create/off never pay for it
+    from alembic.script import ScriptDirectory
+
+    heads = set(ScriptDirectory.from_config(_alembic_config()).get_heads())
+    async with get_engine().connect() as conn:
+        try:
+            current = set((await conn.execute(text("SELECT version_num FROM alembic_version"))).scalars())
+        except DBAPIError:
+            current = set()
+    if current != heads:
+        raise SchemaMismatchError(
+            f"database schema is at {sorted(current) or 'no revision'}, the code expects {sorted(heads)}; "
+            "run `alembic upgrade head`, a database without a revision has to be stamped first (see README)"
+        )
+
+async def init_psql_db(mode: Optional[str] = None):
+    """Prepares the schema per DEF_DB_SCHEMA_MODE:
+
+    - verify: only compares the alembic revision, one query, the default for deployed workers; databases
+      built by create_all have no revision and need an `alembic stamp` once (see README)
+    - migrate: runs `alembic upgrade head`, for single instance deployments
+    - create: `Base.metadata.create_all`, for local development and throwaway databases
+    - off: nothing, the first query opens the first connection
+    """
+    mode = mode or config.DB_SCHEMA_MODE
+    if mode == "verify":
+        await verify_schema()
+    elif mode == "migrate":
+        async with get_engine().begin() as conn:
+            await conn.run_sync(_upgrade_head)
+    elif mode == "create":
+        async with get_engine().begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    elif mode != "off":
+        raise ValueError(f"Unknown schema mode: {mode}")
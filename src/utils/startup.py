@@ -0,0 +1,158 @@
+"""Cold start timings: imports per package, startup phases and time to the first served request.
+
+Imported first by src.main, so it only uses the standard library at import time. Importing it changes
+nothing, src.main starts the import timer when DEF_STARTUP_REPORT_ENABLED is set.
+"""
+import contextlib
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+__all__ = ["StartupReport", "StartupReportMiddleware", "startup_report"]
+
+logger = logging.getLogger("src.startup")
+
+
+def process_age() -> Optional[float]:
+    """Seconds since the process was started, linux only, None elsewhere."""
+    try:
+        with open("/proc/self/stat") as f:
+            started_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - started_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class ImportTimer:
+    """Meta path hook timing each module's exec, `self` excludes the imports it triggered."""
+
+    def __init__(self):
+        self.modules: List[Tuple[str, float, float]] = []  # name, cumulative, self
+        self._stack: List[float] = []  # child time of the module being executed
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        loader = spec.loader
+        # builtin and frozen importers are shared classes, file loaders are per module instances
+        if loader is not None and not isinstance(loader, type) and hasattr(loader, "exec_module"):
+            loader.exec_module = self._timed(name, loader.exec_module)
+        return spec
+
+    def _timed(self, name, exec_module):
+        def timed_exec_module(module):
+            self._stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                total = time.perf_counter() - start
+                children = self._stack.pop()
+                if self._stack:
+                    self._stack[-1] += total
+                self.modules.append((name, total, total - children))
+
+        return timed_exec_module
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        with contextlib.suppress(ValueError):
+            sys.meta_path.remove(self)
+
+    def by_package(self) -> Dict[str, float]:
+        packages = defaultdict(float)
+        for name, _, own in self.modules:
+            packages[name.partition(".")[0]] += own
+        return dict(sorted(packages.items(), key=lambda item: -item[1]))
+
+
+class StartupReport:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.process_age_at_import = process_age()
+        self.phases: Dict[str, float] = {}
+        self.imports = ImportTimer()
+        self.ready_at: Optional[float] = None
+        self.first_request_at: Optional[float] = None
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+
+    def time_imports(self):
+        """Times every module imported from now until `imports_done`."""
+        self.imports.install()
+
+    def imports_done(self):
+        """Called once the app module is fully imported, stops timing further (lazy) imports."""
+        self.imports.uninstall()
+        self.phases["imports"] = time.perf_counter() - self.started
+
+    def ready(self):
+        self.ready_at = time.perf_counter() - self.started
+        from src.settings import config
+
+        if config.STARTUP_REPORT_ENABLED:
+            packages = ", ".join(f"{name} {seconds * 1000:.0f}ms"
+                                 for name, seconds in list(self.imports.by_package().items())[:8])
+            phases = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.phases.items())
+            logger.info("started in %.0fms (%s), slowest imports: %s", self.ready_at * 1000, phases, packages)
+
+    def first_request(self):
+        self.first_request_at = time.perf_counter() - self.started
+        from src.settings import config
+
+        if config.STARTUP_REPORT_ENABLED:
+            logger.info("first request served %.0fms after import%s", self.first_request_at * 1000,
+                        "" if self.process_age_at_import is None else
+                        f", {(self.process_age_at_import + self.first_request_at) * 1000:.0f}ms after process start")
+
+    def stats(self, top: int = 20) -> dict:
+        slowest = sorted(self.imports.modules, key=lambda module: -module[2])[:top]
+        return {
+            "process_age_at_import": self.process_age_at_import,
+            "phases": self.phases,
+            "ready": self.ready_at,
+            "first_request": self.first_request_at,
+            "imports_by_package": self.imports.by_package(),
+            "slowest_imports": [{"module": name, "cumulative": total, "self": own} for name, total, own in slowest],
+        }
+
+
+class StartupReportMiddleware:
+    """Records when the first HTTP response finished, then only costs a flag check."""
+
+    def __init__(self, app, report: "StartupReport"):
+        self.app = app
+        self.report = report
+        self.pending = True
+
+    async def __call__(self, scope, receive, send):
+        if not self.pending or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if self.pending:
+                self.pending = False
+                self.report.first_request()
+
+
+startup_report = StartupReport()
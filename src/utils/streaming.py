@@ -0,0 +1,43 @@
+import codecs
+from typing import AsyncIterator, List, Optional, Tuple, TypeVar
+
+__all__ = ["iter_lines", "iter_chunks"]
+
+T = TypeVar("T")
+
+
+async def iter_lines(stream: AsyncIterator[bytes], encoding: str = "utf-8",
+                     max_length: int = 65536) -> AsyncIterator[Tuple[int, Optional[str]]]:
+    """Splits a byte stream into (line number, line) pairs without buffering more than one line. A line
+    longer than `max_length` characters comes as (line number, None), dropped as soon as the buffer
+    passes it, and the lines after it follow as usual."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pending, line_number, dropping = "", 0, False
+    async for chunk in stream:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            line_number += 1
+            if dropping or len(line) > max_length:
+                dropping = False
+                yield line_number, None
+            else:
+                yield line_number, line.rstrip("\r")
+        if len(pending) > max_length:
+            pending, dropping = "", True
+    pending += decoder.decode(b"", final=True)
+    if dropping or len(pending) > max_length:
+        yield line_number + 1, None
+    elif pending:
+        yield line_number + 1, pending.rstrip("\r")
+
+
+async def iter_chunks(items: AsyncIterator[T], size: int) -> AsyncIterator[List[T]]:
+    chunk: List[T] = []
+    async for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
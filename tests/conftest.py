@@ -0,0 +1,101 @@
+import os
+import tempfile
+from uuid import uuid4
+
+# settings are read at import time, so the environment is prepared before src is imported
+DB_PATH = os.path.join(tempfile.gettempdir(), f"fastapi-boilerplate-tests-{os.getpid()}.db")
+os.environ.update({
+    "DEF_SQL_URI": f"sqlite+aiosqlite:///{DB_PATH}",
+    "DEF_DB_SCHEMA_MODE": "off",
+    "DEF_CACHE_BACKEND": "memory",
+    "DEF_RATE_LIMIT_ENABLED": "false",
+    "DEF_JOBS_RUN_IN_APP": "false",
+    "DEF_STARTUP_REPORT_ENABLED": "false",
+    "DEF_SQL_DETECTOR_ENABLED": "true",
+    "DEF_SQL_QUERY_BUDGET_ENFORCE": "true",
+    "DEF_SQL_SLOW_QUERY_MS": "0",
+})
+
+import asyncio
+
+import httpx
+import pytest
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db_schema():
+    from src.utils.single_psql_db import Base, dispose_engine, get_engine
+    from src.utils.cache import shared_cache
+    from src.users.user.cache import current_user_cache
+    from src.auth.current_user import decoded_token_cache
+
+    import src.jobs.job.models  # noqa: F401, registers the jobs table
+    import src.auth.access.models  # noqa: F401
+
+    async with get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    for cache in (current_user_cache, decoded_token_cache, shared_cache.backend.entries):
+        cache.clear()
+    shared_cache.backend._tags.clear()
+    yield
+    # pooled aiosqlite connections belong to this test's event loop
+    await dispose_engine()
+
+
+@pytest.fixture
+async def db(db_schema):
+    from src.utils.single_psql_db import SessionLocal
+
+    async with SessionLocal() as session:
+        yield session
+
+
+async def create_user(db, email: str = None, password: str = "secret123", is_superuser: bool = False):
+    from src.users.user.models import User
+    from src.utils.password_hasher import password_hasher
+
+    user = await User.insert_returning(db, {
+        "email": email or f"user-{uuid4().hex[:8]}@example.com", "first_name": "Test", "last_name": "User",
+        "password": await password_hasher.hash(password), "is_superuser": is_superuser,
+    })
+    await db.commit()
+    return user
+
+
+def access_token(user) -> str:
+    from src.auth.base.service import AuthService
+    from src.settings import config
+
+    perms = ["*"] if user.is_superuser else []
+    return AuthService.create_access_token({"sub": user.email, "perms": perms},
+                                           expires_delta=config.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
+
+
+@pytest.fixture
+async def client(db_schema):
+    from src.main import app
+
+    async def app_in_own_task(scope, receive, send):
+        # as under a real server, the request's contextvars (query log, checkouts) don't leak into the test
+        await asyncio.create_task(app(scope, receive, send))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app_in_own_task), base_url="http://test") as c:
+        yield c
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+async def superuser(db):
+    return await create_user(db, email="admin@example.com", is_superuser=True)
+
+
+@pytest.fixture
+async def admin_client(client, superuser):
+    client.cookies.set("Authorization", access_token(superuser))
+    return client
@@ -0,0 +1,44 @@
+import gzip
+
+import pytest
+
+from tests.conftest import create_user
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_compressed_listing_and_its_304_carry_the_same_weak_etag(admin_client, db):
+    for _ in range(10):  # over COMPRESSION_MIN_SIZE
+        await create_user(db)
+
+    r = await admin_client.get("/users", params={"pageSize": 50}, headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["content-encoding"] == "gzip" and "accept-encoding" in r.headers["vary"].lower()
+    etag = r.headers["etag"]
+    assert etag.startswith("W/")
+
+    r = await admin_client.get("/users", params={"pageSize": 50},
+                               headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.headers["etag"] == etag
+    assert "accept-encoding" in r.headers["vary"].lower()
+    assert "content-encoding" not in r.headers
+
+    # without a negotiated coding both stay strong
+    r = await admin_client.get("/users", params={"pageSize": 50}, headers={"Accept-Encoding": "identity"})
+    assert r.headers["etag"] == etag.removeprefix("W/") and "content-encoding" not in r.headers
+    r = await admin_client.get("/users", params={"pageSize": 50},
+                               headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert r.status_code == 304 and r.headers["etag"] == etag.removeprefix("W/")
+
+
+def test_encoders_round_trip():
+    from src.utils.compression import Encoder, GzipEncoder
+
+    body = b'{"items": []}' * 100
+    encoder = GzipEncoder(1)
+    assert gzip.decompress(encoder.compress(body)) == body
+    stream = encoder.stream()
+    assert gzip.decompress(stream.chunk(body[:500]) + stream.finish(body[500:])) == body
+    with pytest.raises(TypeError):
+        Encoder()
@@ -0,0 +1,101 @@
+from uuid import uuid4
+
+import pytest
+
+from src.users.user.cache import cached_user, current_user_cache, forget_user, remember_user
+from src.users.user.schemas import UserSnapshot
+
+pytestmark = pytest.mark.anyio
+
+
+def snapshot(email: str) -> UserSnapshot:
+    return UserSnapshot(id=uuid4(), email=email, is_active=True, is_superuser=False)
+
+
+def test_forget_user_drops_only_that_users_snapshot():
+    alice, bob = snapshot("alice@example.com"), snapshot("bob@example.com")
+    remember_user(alice.email, alice)
+    remember_user(bob.email, bob)
+
+    forget_user(alice.id)
+
+    assert cached_user(alice.email) is None
+    assert cached_user(bob.email) == bob
+
+
+def test_index_pruning_keeps_cached_snapshots(monkeypatch):
+    monkeypatch.setattr(current_user_cache, "maxsize", 2)
+    current_user_cache.clear()
+    users = [snapshot(f"user{i}@example.com") for i in range(6)]
+    for user in users:
+        remember_user(user.email, user)
+
+    forget_user(users[-1].id)
+
+    assert cached_user(users[-1].email) is None
+    assert cached_user(users[-2].email) == users[-2]
+
+
+async def test_deactivated_user_is_rejected_on_the_next_request(admin_client, db):
+    from tests.conftest import access_token, create_user
+
+    user = await create_user(db)
+    admin_client.cookies.set("Authorization", access_token(user))
+    assert (await admin_client.get("/auth/me")).status_code == 200
+
+    from src.users.user.models import User
+    from src.users.user.schemas import UserUpdate
+
+    await User.update(db, user.id, UserUpdate(is_active=False))
+
+    assert (await admin_client.get("/auth/me")).status_code == 401
+
+
+async def test_writes_in_an_atomic_block_invalidate_once_committed(db):
+    from tests.conftest import create_user
+
+    from src.users.user.cache import USERS_TAG, user_tag
+    from src.users.user.models import User
+    from src.users.user.schemas import UserUpdate
+    from src.utils.cache import shared_cache
+    from src.utils.single_psql_db import atomic
+
+    user = await create_user(db)
+    await shared_cache.backend.set("listing", b"cached", 60, tags=[USERS_TAG])
+    remember_user(user.email, UserSnapshot.model_validate(user, from_attributes=True))
+
+    async with atomic(db):
+        await User.update(db, user.id, UserUpdate(first_name="Renamed"))
+        # still uncommitted, a reader refilling the cache now would store the old row
+        assert await shared_cache.get("listing") == b"cached"
+        assert cached_user(user.email) is not None
+    assert await shared_cache.get("listing") is None
+    assert cached_user(user.email) is None
+
+    key = user_tag(user.id)
+    await shared_cache.backend.set(key, b"cached", 60, tags=[key])
+    with pytest.raises(RuntimeError):
+        async with atomic(db):
+            await User.update(db, user.id, UserUpdate(first_name="Rolled back"))
+            raise RuntimeError
+    assert await shared_cache.get(key) == b"cached"
+
+
+async def test_a_fill_racing_an_invalidation_is_not_stored():
+    from src.utils.cache import Cache, MemoryCacheBackend
+
+    cache = Cache(MemoryCacheBackend(maxsize=10), ttl=60, lock_timeout=1)
+
+    async def stale_read():
+        # read before the write below, returned after it invalidated the tag
+        await cache.invalidate_tags("users")
+        return b"stale"
+
+    assert await cache.get_or_set("listing", stale_read, tags=["users"]) == b"stale"
+    assert await cache.get("listing") is None
+
+    async def fresh_read():
+        return b"fresh"
+
+    assert await cache.get_or_set("listing", fresh_read, tags=["users"]) == b"fresh"
+    assert await cache.get("listing") == b"fresh"
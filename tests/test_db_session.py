@@ -0,0 +1,63 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def checkouts():
+    """Connections each request checked out, read from checkout_count() when its session closes."""
+    from src.main import app
+    from src.utils.single_psql_db import checkout_count, get_session
+
+    counts = []
+
+    async def counted_session():
+        session = get_session()
+        db = await session.__anext__()
+        try:
+            yield db
+        finally:
+            counts.append(checkout_count())
+            await session.aclose()
+
+    app.dependency_overrides[get_session] = counted_session
+    yield counts
+    app.dependency_overrides.pop(get_session, None)
+
+
+@pytest.mark.parametrize("cold", [False, True], ids=["warm", "cold"])
+async def test_user_endpoints_check_out_one_connection_per_request(admin_client, checkouts, cold):
+    from src.users.user.cache import current_user_cache
+
+    def warm_or_cold():
+        # cold: get_current_user has to read the user, on the request's own connection
+        if cold:
+            current_user_cache.clear()
+
+    await admin_client.get("/auth/me")  # caches the current user snapshot
+    checkouts.clear()
+
+    warm_or_cold()
+    r = await admin_client.post("/users", json={"email": "new@example.com", "password": "secret123",
+                                                "first_name": "New", "last_name": "User"})
+    assert r.status_code == 201
+    warm_or_cold()
+    r = await admin_client.get("/users", params={"search": "new@example.com"})
+    user_id = r.json()["details"]["items"][0]["id"]
+    warm_or_cold()
+    r = await admin_client.put(f"/users/{user_id}", json={"first_name": "Renamed"})
+    assert r.status_code == 200
+    warm_or_cold()
+    r = await admin_client.delete(f"/users/{user_id}")
+    assert r.status_code == 200
+
+    assert checkouts == [1, 1, 1, 1]
+
+async def test_loader_checkouts_count_against_the_request_that_started_the_batch(admin_client, superuser,
+                                                                                  checkouts):
+    await admin_client.get("/auth/me")  # caches the current user snapshot, the request session stays unused
+    checkouts.clear()
+
+    r = await admin_client.post("/users/batch-get", json={"ids": [str(superuser.id)]})
+    assert r.status_code == 200 and len(r.json()["details"]["items"]) == 1
+    assert checkouts == [1]
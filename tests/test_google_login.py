@@ -0,0 +1,155 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+from tests.conftest import create_user
+
+pytestmark = pytest.mark.anyio
+
+CLIENT_ID = "test-client.apps.googleusercontent.com"
+
+
+class OAuthProvider:
+    """A local OpenID provider: serves its JWKS and a token endpoint that answers a known code with the
+    id_token queued for it."""
+
+    def __init__(self):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.pem = private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                             serialization.NoEncryption())
+        public = jwk.construct(private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo), "RS256").to_dict()
+        self.jwks = {"keys": [{**public, "kid": "test-key", "use": "sig"}]}
+        self.codes = {}
+        self.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def id_token(self, **claims) -> str:
+        now = int(time.time())
+        claims = {"iss": "https://accounts.google.com", "aud": CLIENT_ID, "iat": now, "exp": now + 300,
+                  "sub": "1234567890", **claims}
+        return jwt.encode(claims, self.pem, algorithm="RS256", headers={"kid": "test-key"})
+
+    def _handler(self):
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                provider.requests.append(self.path)
+                self.reply(200, provider.jwks, {"Cache-Control": "public, max-age=3600"})
+
+            def do_POST(self):
+                provider.requests.append(self.path)
+                form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+                id_token = provider.codes.get(form["code"][0])
+                if id_token is None or form["client_id"] != [CLIENT_ID]:
+                    self.reply(400, {"error": "invalid_grant"})
+                else:
+                    self.reply(200, {"access_token": "at", "token_type": "Bearer", "id_token": id_token})
+
+            def reply(self, status, body, headers=None):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+async def provider(monkeypatch):
+    from src.auth.base.google import google_jwks
+    from src.settings import config
+    from src.utils.http_client import http_client
+
+    provider = OAuthProvider()
+    thread = threading.Thread(target=provider.server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(config, "GOOGLE_CLIENT_ID", CLIENT_ID)
+    monkeypatch.setattr(config, "GOOGLE_TOKEN_URL", f"{provider.url}/token")
+    monkeypatch.setattr(google_jwks, "url", f"{provider.url}/certs")
+    monkeypatch.setattr(google_jwks, "keys", {})
+    monkeypatch.setattr(google_jwks, "expires_at", 0.0)
+    monkeypatch.setattr(google_jwks, "fetched_at", 0.0)
+    yield provider
+    await google_jwks.stop()
+    await http_client.close()  # its pooled connections belong to this test's event loop
+    provider.server.shutdown()
+    provider.server.server_close()
+
+
+async def google_login(client, provider, **claims):
+    code = f"code-{len(provider.codes)}"
+    provider.codes[code] = provider.id_token(**claims)
+    return await client.post("/auth/oauth2/google", params={"credentials": code})
+
+
+async def test_google_login_creates_an_account_for_a_verified_email(client, provider):
+    from src.users.user.models import User
+    from src.utils.single_psql_db import SessionLocal
+
+    r = await google_login(client, provider, email="ada@example.com", email_verified=True,
+                           given_name="Ada", family_name="Lovelace")
+    assert r.status_code == 200
+    assert jwt.get_unverified_claims(r.json()["details"])["sub"] == "ada@example.com"
+    assert provider.requests == ["/token", "/certs"]
+    async with SessionLocal() as db:
+        user = await User.by_email(db, "ada@example.com")
+    assert (user.first_name, user.last_name) == ("Ada", "Lovelace")
+
+    r = await google_login(client, provider, email="ada@example.com", email_verified=True)
+    assert r.status_code == 200
+    assert provider.requests.count("/certs") == 1  # keys are cached
+
+
+async def test_unverified_email_is_not_linked_to_an_existing_account(client, db, provider):
+    await create_user(db, email="ada@example.com")
+
+    for verified in (False, "true", None):
+        claims = {"email_verified": verified} if verified is not None else {}
+        r = await google_login(client, provider, email="ada@example.com", **claims)
+        assert r.status_code == 401, verified
+        assert "Authorization" not in r.cookies
+
+    r = await google_login(client, provider, email="ada@example.com", email_verified=True)
+    assert r.status_code == 200
+
+
+async def test_google_login_rejects_foreign_tokens_and_bad_codes(client, provider):
+    r = await google_login(client, provider, email="ada@example.com", email_verified=True, aud="someone-else")
+    assert r.status_code == 401
+    r = await google_login(client, provider, email="ada@example.com", email_verified=True,
+                           iss="https://evil.example.com")
+    assert r.status_code == 401
+    r = await client.post("/auth/oauth2/google", params={"credentials": "unknown-code"})
+    assert r.status_code == 401
+
+
+async def test_an_unreachable_token_endpoint_answers_503(client, provider, monkeypatch):
+    import socket
+
+    from src.settings import config
+
+    with socket.socket() as unused:  # a port nothing listens on once it is closed
+        unused.bind(("127.0.0.1", 0))
+        port = unused.getsockname()[1]
+    monkeypatch.setattr(config, "GOOGLE_TOKEN_URL", f"http://127.0.0.1:{port}/token")
+
+    r = await google_login(client, provider, email="ada@example.com", email_verified=True)
+    assert r.status_code == 503
+    assert "Authorization" not in r.cookies
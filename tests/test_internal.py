@@ -0,0 +1,38 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def internal_token(monkeypatch):
+    from src.settings import config
+
+    monkeypatch.setattr(config, "INTERNAL_TOKEN", "internal-secret")
+    return "internal-secret"
+
+
+async def test_internal_routes_are_closed_without_a_configured_token(client):
+    r = await client.get("/internal/db-pool")
+    assert r.status_code == 404
+
+
+async def test_internal_routes_need_the_token(client, internal_token):
+    r = await client.get("/internal/db-pool")
+    assert r.status_code == 401
+    r = await client.get("/internal/db-pool", headers={"Authorization": "Bearer wrong"})
+    assert r.status_code == 401
+    r = await client.get("/internal/db-pool", headers={"Authorization": f"Bearer {internal_token}"})
+    assert r.status_code == 200
+
+
+async def test_a_user_session_does_not_open_internal_routes(admin_client, internal_token):
+    r = await admin_client.get("/internal/caches")
+    assert r.status_code == 401
+
+
+async def test_metrics_need_the_token(client, internal_token):
+    r = await client.get("/metrics")
+    assert r.status_code == 401
+    r = await client.get("/metrics", headers={"Authorization": f"Bearer {internal_token}"})
+    assert r.status_code == 200
+    assert "http_requests_total" in r.text
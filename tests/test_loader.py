@@ -0,0 +1,95 @@
+import asyncio
+import contextvars
+
+import pytest
+
+from src.utils.loader import BatchLoader
+
+pytestmark = pytest.mark.anyio
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def recording_loader(max_batch_size: int = 100, window: float = 0.0, delay: float = 0.0, fail: bool = False):
+    calls = []
+
+    async def fetch(keys):
+        calls.append((list(keys), request_id.get()))
+        await asyncio.sleep(delay)
+        if fail:
+            raise LookupError("backend down")
+        return {key: key * 10 for key in keys if key >= 0}
+
+    return BatchLoader("test", fetch, max_batch_size=max_batch_size, window=window), calls
+
+
+async def test_concurrent_loads_share_one_fetch():
+    loader, calls = recording_loader(window=0.01)
+
+    assert await asyncio.gather(loader.load(1), loader.load(2), loader.load(-1)) == [10, 20, None]
+    assert [keys for keys, _ in calls] == [[1, 2, -1]]
+
+    assert await loader.load_many([3, 4, -2]) == {3: 30, 4: 40}
+    assert len(calls) == 2
+
+
+async def test_repeated_keys_are_fetched_once():
+    loader, calls = recording_loader()
+
+    results = await asyncio.gather(loader.load(1), loader.load(1), loader.load_many([1, 2]))
+    assert results == [10, 10, {1: 10, 2: 20}]
+    assert [keys for keys, _ in calls] == [[1, 2]]
+    assert loader.stats()["coalesced"] == 2
+
+
+async def test_full_batches_are_sent_right_away():
+    loader, calls = recording_loader(max_batch_size=2, window=10)
+
+    assert await asyncio.wait_for(asyncio.gather(loader.load(1), loader.load(2)), timeout=1) == [10, 20]
+    assert [keys for keys, _ in calls] == [[1, 2]]
+
+
+async def test_a_cancelled_caller_does_not_cancel_the_batch():
+    loader, calls = recording_loader(delay=0.05)
+
+    first = asyncio.ensure_future(loader.load(1))
+    second = asyncio.ensure_future(loader.load(1))
+    await asyncio.sleep(0.01)  # the batch is running
+    first.cancel()
+
+    assert await second == 10
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    assert len(calls) == 1
+
+
+async def test_a_cancelled_batch_cancels_its_callers():
+    loader, calls = recording_loader(delay=10)
+
+    waiter = asyncio.ensure_future(loader.load(1))
+    await asyncio.sleep(0.01)
+    task, = loader._tasks
+    task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    await asyncio.sleep(0)
+    assert loader.stats()["inflight_batches"] == 0
+
+
+async def test_fetch_errors_reach_every_caller():
+    loader, _ = recording_loader(fail=True)
+
+    results = await asyncio.gather(loader.load(1), loader.load(2), return_exceptions=True)
+    assert [type(result) for result in results] == [LookupError, LookupError]
+
+
+async def test_fetch_runs_in_the_context_of_the_caller_that_started_the_batch():
+    loader, calls = recording_loader()
+
+    async def request(name: str):
+        request_id.set(name)
+        return await loader.load(1)
+
+    await asyncio.gather(request("a"), request("b"))
+    assert calls == [([1], "a")]
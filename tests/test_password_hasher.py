@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from tests.conftest import create_user
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_sign_in_over_the_hashers_capacity_answers_503(client, db, monkeypatch):
+    from src.utils.password_hasher import password_hasher
+
+    await create_user(db, email="ada@example.com", password="secret123")
+    monkeypatch.setattr(password_hasher, "in_flight", password_hasher.capacity)
+    rejected = password_hasher.rejected
+
+    r = await client.post("/auth/sign-in", json={"identifier": "ada@example.com", "password": "secret123"})
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == str(password_hasher.retry_after)
+    assert password_hasher.rejected == rejected + 1
+
+
+async def test_hash_many_waits_for_workers_instead_of_being_rejected():
+    from src.utils.exceptions import ServiceUnavailableError
+    from src.utils.password_hasher import PasswordHasher, _verify
+
+    hasher = PasswordHasher(workers=2, queue_size=0, retry_after=3)
+    try:
+        passwords = [f"secret{i}" for i in range(5)]
+        batch = asyncio.create_task(hasher.hash_many(passwords))
+        while hasher.in_flight < 2:
+            await asyncio.sleep(0.001)
+        # the batch fills the workers, interactive calls get the back-pressure
+        with pytest.raises(ServiceUnavailableError) as e:
+            await hasher.hash("interactive")
+        assert e.value.headers == {"Retry-After": "3"}
+
+        hashes = await batch
+        assert [_verify(password, hashed) for password, hashed in zip(passwords, hashes)] == [True] * 5
+        assert hasher.rejected == 1 and hasher.in_flight == 0
+    finally:
+        hasher.shutdown()
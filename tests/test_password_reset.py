@@ -0,0 +1,77 @@
+import pytest
+from sqlalchemy import select
+
+from tests.conftest import create_user
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def mails(monkeypatch):
+    from src.auth.base import jobs
+
+    sent = []
+
+    async def send_mail(to, subject, body):
+        sent.append((to, body))
+
+    monkeypatch.setattr(jobs, "send_mail", send_mail)
+    return sent
+
+
+async def queued_jobs(db):
+    from src.jobs.job.models import Job
+
+    return (await db.scalars(select(Job).order_by(Job.created_at))).all()
+
+
+async def test_forgot_password_does_the_same_work_for_unknown_addresses(client, db, mails):
+    from src.auth.base.jobs import send_password_reset_mail
+
+    await create_user(db, email="ada@example.com")
+    known = await client.post("/auth/forgot-password", json={"email": "ada@example.com"})
+    unknown = await client.post("/auth/forgot-password", json={"email": "nobody@example.com"})
+    assert known.status_code == unknown.status_code == 200
+    assert known.json() == unknown.json()
+
+    jobs = await queued_jobs(db)
+    assert [job.payload for job in jobs] == [{"email": "ada@example.com"}, {"email": "nobody@example.com"}]
+    for job in jobs:
+        await send_password_reset_mail(job.payload)
+    assert [to for to, _ in mails] == ["ada@example.com"]
+
+
+async def test_reset_token_from_the_mail_works_once(client, db, mails):
+    from src.auth.base.jobs import send_password_reset_mail
+    from src.settings import config
+
+    await create_user(db, email="ada@example.com")
+    await send_password_reset_mail({"email": "ada@example.com"})
+    (_, body), = mails
+    prefix, suffix = config.PASSWORD_RESET_URL.split("{token}")
+    token = body[body.index(prefix) + len(prefix):].split()[0]
+    token = token[:len(token) - len(suffix)] if suffix else token
+
+    reset = {"token": token, "password": "secret456", "password_repeat": "secret456"}
+    assert (await client.post("/auth/reset-password", json=reset)).status_code == 200
+    assert (await client.post("/auth/reset-password", json=reset)).status_code == 401
+
+
+async def test_password_fingerprint_is_keyed(db, monkeypatch):
+    from src.auth.base.service import AuthService
+    from src.settings import config
+
+    user = await create_user(db)
+    fingerprint = AuthService.password_fingerprint(user)
+    monkeypatch.setattr(config, "JWT_SECRET_KEY", config.JWT_SECRET_KEY + "-rotated")
+    assert AuthService.password_fingerprint(user) != fingerprint
+
+
+async def test_unsent_mails_are_logged_without_their_body(caplog):
+    import logging
+
+    from src.utils.mailer import send_mail
+
+    caplog.set_level(logging.INFO, logger="src.mail")
+    await send_mail("ada@example.com", "Şifre sıfırlama", "https://example.com/reset?token=secret")
+    assert "ada@example.com" in caplog.text and "token=secret" not in caplog.text
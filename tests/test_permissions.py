@@ -0,0 +1,53 @@
+import pytest
+
+from tests.conftest import create_user
+
+pytestmark = pytest.mark.anyio
+
+
+async def sign_in(client, email: str):
+    r = await client.post("/auth/sign-in", json={"identifier": email, "password": "secret123"})
+    assert r.status_code == 200
+    return r.json()["details"]
+
+
+async def test_role_changes_revoke_issued_tokens(client, db):
+    from src.auth.access.models import Role
+
+    user = await create_user(db, email="reader@example.com")
+    role = await Role.ensure(db, "reader", ["user.get"])
+    await Role.assign(db, user.id, role.id)
+
+    await sign_in(client, user.email)
+    assert (await client.get(f"/users/{user.id}")).status_code == 200
+
+    await Role.revoke(db, "reader", ["user.get"])
+    assert (await client.get(f"/users/{user.id}")).status_code == 401  # the token still says user.get
+
+    await sign_in(client, user.email)
+    assert (await client.get(f"/users/{user.id}")).status_code == 403
+
+    await Role.ensure(db, "reader", ["user.*"])
+    assert (await client.get(f"/users/{user.id}")).status_code == 401
+    await sign_in(client, user.email)
+    assert (await client.get(f"/users/{user.id}")).status_code == 200
+
+    await Role.unassign(db, user.id, role.id)
+    assert (await client.get(f"/users/{user.id}")).status_code == 401
+    await sign_in(client, user.email)
+    assert (await client.get(f"/users/{user.id}")).status_code == 403
+
+
+async def test_unrelated_role_changes_keep_tokens(client, db):
+    from src.auth.access.models import Role
+
+    user = await create_user(db, email="reader@example.com")
+    other = await create_user(db, email="other@example.com")
+    role = await Role.ensure(db, "reader", ["user.get"])
+    await Role.assign(db, user.id, role.id)
+    await sign_in(client, user.email)
+
+    await Role.assign(db, other.id, role.id)
+    await Role.ensure(db, "auditor", ["user.export"])
+    await Role.revoke(db, "reader", ["user.delete"])  # never granted, nothing changes
+    assert (await client.get(f"/users/{user.id}")).status_code == 200
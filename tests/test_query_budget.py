@@ -0,0 +1,82 @@
+"""Routes under DEF_SQL_QUERY_BUDGET_ENFORCE=true (set in conftest): a route going over its query budget
+raises instead of only logging, so these fail when a change adds statements to a budgeted route."""
+import pytest
+from sqlalchemy import select, text
+
+from tests.conftest import create_user
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_auth_routes_fit_their_budgets(client, db):
+    from src.auth.base.service import AuthService
+    from src.settings import config
+
+    r = await client.post("/auth/sign-up", json={"email": "ada@example.com", "password": "secret123",
+                                                 "password_repeat": "secret123", "first_name": "Ada",
+                                                 "last_name": "Lovelace"})
+    assert r.status_code == 201
+    r = await client.post("/auth/sign-in", json={"identifier": "ada@example.com", "password": "secret123"})
+    assert r.status_code == 200
+    r = await client.get("/auth/me")
+    assert r.status_code == 200
+    r = await client.post("/auth/forgot-password", json={"email": "ada@example.com"})
+    assert r.status_code == 200
+
+    user = await create_user(db, email="alan@example.com")
+    token = AuthService.create_access_token(
+        {"sub": user.email, "purpose": "password_reset", "fp": AuthService.password_fingerprint(user)},
+        expires_delta=config.PASSWORD_RESET_EXPIRE_MINUTES)
+    r = await client.post("/auth/reset-password", json={"token": token, "password": "secret456",
+                                                        "password_repeat": "secret456"})
+    assert r.status_code == 200
+
+
+async def test_user_routes_fit_their_budgets(admin_client, db):
+    ids = [(await create_user(db)).id for _ in range(3)]
+    r = await admin_client.get("/users", params={"pageSize": 2})
+    assert r.status_code == 200
+    r = await admin_client.get("/users", params={"pageSize": 2, "keyset": True})
+    r = await admin_client.get("/users", params={"pageSize": 2, "after": r.json()["details"]["nextCursor"]})
+    assert r.status_code == 200
+    r = await admin_client.get(f"/users/{ids[0]}")
+    assert r.status_code == 200
+    r = await admin_client.post("/users/batch-get", json={"ids": [str(i) for i in ids]})
+    assert r.status_code == 200 and len(r.json()["details"]["items"]) == 3
+
+    r = await admin_client.post("/users", json={"email": "new@example.com", "password": "secret123",
+                                                "first_name": "New", "last_name": "User"})
+    assert r.status_code == 201
+    r = await admin_client.put(f"/users/{ids[0]}", json={"first_name": "Renamed"})
+    assert r.status_code == 200
+    r = await admin_client.delete(f"/users/{ids[1]}")
+    assert r.status_code == 200
+
+
+async def test_statement_over_the_budget_raises(db):
+    from src.utils.query_detector import QueryBudgetExceeded, install_query_detector
+    from src.utils.single_psql_db import track_queries
+
+    install_query_detector()
+    track_queries().budget = 1
+    await db.execute(text("SELECT 1"))
+    with pytest.raises(QueryBudgetExceeded):
+        await db.execute(text("SELECT 2"))
+
+
+async def test_explain_keeps_the_transaction_usable(db):
+    from src.users.user.models import User
+    from src.utils.query_detector import explain
+
+    user = await create_user(db, email="ada@example.com")
+    await db.execute(User.__table__.update().where(User.id == user.id).values(first_name="Uncommitted"))
+    conn = await db.connection()
+
+    plan = await conn.run_sync(lambda sync_conn: explain(sync_conn, "SELECT * FROM no_such_table", ()))
+    assert plan.startswith("EXPLAIN failed")
+    plan = await conn.run_sync(lambda sync_conn: explain(sync_conn, "SELECT * FROM users", ()))
+    assert plan and not plan.startswith("EXPLAIN failed")
+
+    # the failed EXPLAIN was rolled back to its savepoint, the request's own writes are still there
+    assert await db.scalar(select(User.first_name).where(User.id == user.id)) == "Uncommitted"
+    await db.commit()
@@ -0,0 +1,71 @@
+import pytest
+
+from tests.conftest import create_user
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def sign_in_limits(monkeypatch):
+    """Sign-in limited to 5 attempts per ip and 2 per identifier a minute, on fresh buckets."""
+    from src.auth.base.rate_limit import sign_in_limiter
+    from src.settings import config
+    from src.utils.rate_limit import MemoryRateLimitBackend
+
+    monkeypatch.setattr(config, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(config, "RATE_LIMIT_TRUST_FORWARDED", True)
+    monkeypatch.setattr(sign_in_limiter, "backend", MemoryRateLimitBackend(maxsize=100))
+    monkeypatch.setattr(sign_in_limiter, "per_ip", (5, 60))
+    monkeypatch.setattr(sign_in_limiter, "per_key", (2, 60))
+
+
+async def sign_in(client, identifier: str, password: str = "wrong-password", ip: str = "10.0.0.1"):
+    return await client.post("/auth/sign-in", json={"identifier": identifier, "password": password},
+                             headers={"x-forwarded-for": ip})
+
+
+async def test_limited_sign_ins_are_refused_before_any_lookup_or_hashing(client, db, sign_in_limits, monkeypatch):
+    from src.auth.base import service
+    from src.users.user.models import User
+
+    await create_user(db, email="ada@example.com")
+    work = []
+    by_email, verify_password = User.by_email, service.verify_password
+
+    async def counted_by_email(*args):
+        work.append("by_email")
+        return await by_email(*args)
+
+    async def counted_verify_password(*args):
+        work.append("verify_password")
+        return await verify_password(*args)
+
+    monkeypatch.setattr(User, "by_email", counted_by_email)
+    monkeypatch.setattr(service, "verify_password", counted_verify_password)
+
+    assert [(await sign_in(client, "ada@example.com")).status_code for _ in range(2)] == [401, 401]
+    work.clear()
+    r = await sign_in(client, "ada@example.com")
+    assert r.status_code == 429
+    assert 1 <= int(r.headers["retry-after"]) <= 30  # a token every 30 seconds
+    assert work == []
+
+
+async def test_identifier_and_ip_buckets_are_separate(client, sign_in_limits):
+    assert [(await sign_in(client, "ada@example.com")).status_code for _ in range(3)] == [404, 404, 429]
+    # ada's bucket is empty, the ip still has tokens left for other identifiers
+    assert (await sign_in(client, "bob@example.com")).status_code == 404
+    assert (await sign_in(client, "carl@example.com")).status_code == 404
+    # now the ip's bucket is empty too, whatever the identifier, while another ip has its own
+    assert (await sign_in(client, "dave@example.com")).status_code == 429
+    assert (await sign_in(client, "dave@example.com", ip="10.0.0.2")).status_code == 404
+
+
+async def test_a_successful_sign_in_refills_the_identifiers_bucket(client, db, sign_in_limits):
+    await create_user(db, email="ada@example.com", password="secret123")
+
+    assert (await sign_in(client, "ada@example.com")).status_code == 401
+    assert (await sign_in(client, "ada@example.com", password="secret123")).status_code == 200
+    # without the reset, the bucket would have been empty after these two attempts
+    assert [(await sign_in(client, "ada@example.com")).status_code for _ in range(2)] == [401, 401]
+    assert (await sign_in(client, "ada@example.com")).status_code == 429
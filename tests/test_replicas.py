@@ -0,0 +1,158 @@
+import os
+import tempfile
+import types
+
+import pytest
+from sqlalchemy import select
+
+from tests.conftest import create_user
+
+pytestmark = pytest.mark.anyio
+
+
+def sqlite_uri(name: str) -> str:
+    return f"sqlite+aiosqlite:///{os.path.join(tempfile.gettempdir(), f'{name}-{os.getpid()}.db')}"
+
+
+@pytest.fixture
+async def replica_set(db_schema, monkeypatch):
+    """Two sqlite replicas in place of the configured set, each holding one user the primary doesn't have."""
+    from src.users.user.models import User
+    from src.utils import single_psql_db
+    from src.utils.single_psql_db import Base, ReplicaSet
+
+    replica_set = ReplicaSet([sqlite_uri("replica-a"), sqlite_uri("replica-b")])
+    for name, replica in zip("ab", replica_set.replicas):
+        async with replica.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(User.__table__.insert().values(
+                email=f"replica-{name}@example.com", first_name="Replica", last_name=name, password="x"))
+    monkeypatch.setattr(single_psql_db, "_replicas", replica_set)
+    yield replica_set
+    await replica_set.dispose()
+
+
+async def emails(db, replica: bool):
+    from src.users.user.models import User
+
+    return set(await db.scalars(select(User.email).execution_options(replica=replica)))
+
+
+async def test_marked_reads_go_to_a_replica(db, replica_set):
+    from src.utils.single_psql_db import SessionLocal
+
+    async with SessionLocal() as writer:  # a write would pin `db` to the primary
+        await create_user(writer, email="primary@example.com")
+
+    assert await emails(db, replica=False) == {"primary@example.com"}
+    # round robin over both replicas
+    assert await emails(db, replica=True) == {"replica-a@example.com"}
+    assert await emails(db, replica=True) == {"replica-b@example.com"}
+    assert await emails(db, replica=True) == {"replica-a@example.com"}
+
+
+async def test_reads_after_a_write_stay_on_the_primary(db, replica_set):
+    from src.users.user.models import User
+    from src.utils.single_psql_db import SessionLocal
+
+    await User.update_returning(db, User.email == "nobody@example.com", {"first_name": "Nobody"})
+    assert db.sync_session.info["wrote"]
+    assert await emails(db, replica=True) == set()  # the primary, replicas would answer with their user
+    await db.commit()
+    assert await emails(db, replica=True) == set()  # pinned for the rest of the session
+
+    async with SessionLocal() as other:  # a new session (request) reads from a replica again
+        assert await emails(other, replica=True) == {"replica-a@example.com"}
+
+
+async def test_unhealthy_replicas_leave_the_rotation(db, replica_set):
+    a, b = replica_set.replicas
+    a.mark_down("connection refused")
+    assert [await emails(db, replica=True) for _ in range(2)] == [{"replica-b@example.com"}] * 2
+
+    b.mark_down("connection refused")
+    assert replica_set.choose() is None
+    assert await emails(db, replica=True) == set()  # every replica down, reads fall back to the primary
+
+    await replica_set.check()
+    assert a.healthy and b.healthy and a.last_error is None
+
+
+async def test_health_check_and_lost_connections_mark_a_replica_down(db_schema):
+    from src.utils.single_psql_db import ReplicaSet
+
+    broken = ReplicaSet([f"sqlite+aiosqlite:///{tempfile.gettempdir()}/no-such-dir-{os.getpid()}/replica.db"])
+    try:
+        await broken.check()
+        replica, = broken.replicas
+        assert not replica.healthy and "unable to open database file" in replica.last_error
+        assert broken.choose() is None
+    finally:
+        await broken.dispose()
+
+    working = ReplicaSet([sqlite_uri("replica-a")])
+    try:
+        replica, = working.replicas
+        replica._handle_error(types.SimpleNamespace(is_disconnect=False, original_exception=ValueError("bad sql")))
+        assert replica.healthy
+        replica._handle_error(types.SimpleNamespace(is_disconnect=True, original_exception=OSError("reset")))
+        assert not replica.healthy and replica.last_error == "reset"
+    finally:
+        await working.dispose()
+
+
+async def test_least_connections_picks_the_idlest_replica(db_schema):
+    from src.utils.single_psql_db import ReplicaSet
+
+    replica_set = ReplicaSet([sqlite_uri("replica-a"), sqlite_uri("replica-b")], policy="least_connections")
+    try:
+        a, b = replica_set.replicas
+        async with a.engine.connect():
+            assert a.in_use == 1
+            assert replica_set.choose() is b
+        assert a.in_use == 0
+    finally:
+        await replica_set.dispose()
+    with pytest.raises(ValueError):
+        ReplicaSet([], policy="random")
+
+
+async def test_conditional_get_validators_come_from_the_primary(db, replica_set):
+    from src.users.user.models import User
+    from src.utils.single_psql_db import SessionLocal
+
+    async with SessionLocal() as writer:
+        user = await create_user(writer, email="primary@example.com")
+
+    # the replicas have never seen this user, as if they lagged behind its creation (or last update)
+    assert await User.version_of(db, user.id) == user.updated_at
+    assert not db.sync_session.info.get("wrote")
+
+
+async def test_the_cached_user_payload_comes_from_the_primary(admin_client, superuser, replica_set):
+    from src.users.user.cache import remember_user
+    from src.users.user.schemas import UserSnapshot
+    from src.users.user.service import UserService
+    from src.utils.single_psql_db import SessionLocal
+
+    remember_user(superuser.email, UserSnapshot.model_validate(superuser))  # the replicas don't know the admin
+    async with SessionLocal() as writer:
+        user = await create_user(writer, email="primary@example.com")
+
+    # the replicas lag behind the user's creation, a payload read from one would be missing or stale
+    r = await admin_client.get(f"/users/{user.id}")
+    assert r.status_code == 200 and r.json()["details"]["email"] == "primary@example.com"
+    assert r.headers["etag"] == UserService.user_etag(user.id, user.updated_at)
+
+
+def test_importing_the_app_builds_no_replica_engine():
+    import subprocess
+    import sys
+
+    # a fresh interpreter, this one has built the set already
+    code = ("from src.main import app\n"
+            "from src.utils import single_psql_db\n"
+            "assert single_psql_db._replicas is None and single_psql_db._engine is None\n")
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.dirname(__file__)),
+                   env={**os.environ, "DEF_SQL_REPLICA_URIS": f'["{sqlite_uri("replica-a")}"]'})
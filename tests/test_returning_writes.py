@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy import event
+
+from tests.conftest import create_user
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def statements(db_schema):
+    """SQL sent through the engine while the test runs."""
+    from src.utils.single_psql_db import get_engine
+
+    sent = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        sent.append(statement)
+
+    engine = get_engine().sync_engine
+    event.listen(engine, "before_cursor_execute", record)
+    yield sent
+    event.remove(engine, "before_cursor_execute", record)
+
+
+async def test_user_writes_take_one_statement_each(db, statements):
+    from src.users.user.models import User
+    from src.users.user.schemas import UserCreate, UserUpdate
+
+    user = await User.create(db, UserCreate(email="ada@example.com", password="secret123",
+                                            first_name="Ada", last_name="Lovelace"))
+    assert [s.split()[0] for s in statements] == ["INSERT"]
+    assert "RETURNING" in statements[0]
+    assert user.first_name == "Ada" and user.created_at is not None
+
+    statements.clear()
+    user = await User.update(db, user.id, UserUpdate(first_name="Augusta"))
+    assert [s.split()[0] for s in statements] == ["UPDATE"]
+    assert user.first_name == "Augusta"
+
+    statements.clear()
+    user = await User.delete(db, user.id)
+    assert [s.split()[0] for s in statements] == ["DELETE"]
+    assert user.email == "ada@example.com"
+
+
+async def test_returning_helpers_load_the_row_without_a_refresh(db, statements):
+    from src.users.user.models import User
+
+    user = await create_user(db, email="alan@example.com")
+    statements.clear()
+
+    updated = await User.update_returning(db, User.id == user.id, {"last_name": "Turing"})
+    assert updated is user and user.last_name == "Turing"  # the identity map entry is refreshed in place
+    missing = await User.delete_returning(db, User.email == "nobody@example.com")
+    assert missing is None
+    assert [s.split()[0] for s in statements] == ["UPDATE", "DELETE"]
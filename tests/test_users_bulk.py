@@ -0,0 +1,72 @@
+import csv
+import io
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def csv_body(rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)  # quotes fields the way the export does
+    return buffer.getvalue().encode()
+
+
+async def test_bulk_csv_keeps_newlines_in_quoted_fields(admin_client):
+    body = csv_body([["email", "password", "first_name", "last_name"],
+                     ["ada@example.com", "secret123", "Ada\nAugusta", "Lovelace"],
+                     ["alan@example.com", "secret123", "Alan", "Turing"]])
+    r = await admin_client.post("/users/bulk", content=body, headers={"content-type": "text/csv"})
+    report = r.json()["details"]
+    assert (report["created"], report["failed"]) == (2, 0)
+
+    r = await admin_client.get("/users/export", params={"format": "csv"})
+    exported = list(csv.DictReader(io.StringIO(r.text)))
+    assert {row["email"]: row["first_name"] for row in exported}["ada@example.com"] == "Ada\nAugusta"
+
+
+async def test_bulk_csv_reports_rows_by_their_first_line(admin_client):
+    body = csv_body([["email", "password", "first_name", "last_name"],
+                     ["ada@example.com", "secret123", "Ada\n\nAugusta", "Lovelace"],
+                     ["not-an-email", "secret123", "Alan", "Turing"]])
+    r = await admin_client.post("/users/bulk", content=body, headers={"content-type": "text/csv"})
+    report = r.json()["details"]
+    assert report["created"] == 1
+    assert [error["row"] for error in report["errors"]] == [5]
+
+
+async def test_bulk_reports_overlong_records_and_goes_on(admin_client, monkeypatch):
+    from src.settings import config
+
+    monkeypatch.setattr(config, "USERS_BULK_MAX_LINE_LENGTH", 100)
+    monkeypatch.setattr(config, "USERS_BULK_CHUNK_SIZE", 1)  # the first record is committed before the long one
+    body = (b'{"email": "ada@example.com", "password": "secret123", "first_name": "Ada", "last_name": "L"}\n'
+            b'{"email": "bob@example.com", "password": "secret123", "first_name": "' + b"B" * 200 + b'"}\n'
+            b'{"email": "cy@example.com", "password": "secret123", "first_name": "Cy", "last_name": "C"}\n')
+    r = await admin_client.post("/users/bulk", content=body, headers={"content-type": "application/x-ndjson"})
+    report = r.json()["details"]
+    assert (report["created"], report["failed"]) == (2, 1)
+    assert [error["row"] for error in report["errors"]] == [2]
+
+    body = csv_body([["email", "password", "first_name", "last_name"],
+                     ["dan@example.com", "secret123", "A\n" * 60, "D"],
+                     ["eve@example.com", "secret123", "E" * 200, "E"],
+                     ["fay@example.com", "secret123", "Fay", "F"]])
+    r = await admin_client.post("/users/bulk", content=body, headers={"content-type": "text/csv"})
+    report = r.json()["details"]
+    assert (report["created"], report["failed"]) == (1, 2)
+    assert [error["row"] for error in report["errors"]] == [2, 63]
+
+    body = csv_body([["email", "password", "first_name" + "x" * 200]])
+    r = await admin_client.post("/users/bulk", content=body, headers={"content-type": "text/csv"})
+    assert r.status_code == 400 and r.json()["message"].startswith("1. satır")
+
+
+async def test_iter_lines_drops_overlong_lines_across_chunks():
+    from src.utils.streaming import iter_lines
+
+    async def stream():
+        for chunk in (b"ab", b"cdefg", b"h\nok\n", b"xyz", b"xyz"):
+            yield chunk
+
+    assert [line async for line in iter_lines(stream(), max_length=3)] == [(1, None), (2, "ok"), (3, None)]
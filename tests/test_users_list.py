@@ -0,0 +1,54 @@
+import pytest
+
+from tests.conftest import create_user
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_fields_select_only_the_requested_columns(admin_client, db):
+    from src.users.user.service import UserService
+    from src.utils.schemas import PaginationGet
+
+    names, columns = UserService._list_columns(PaginationGet(fields="email"))
+    # id and updated_at are still read, for the ETag and cursors, but are not items' fields
+    assert names == ("email",)
+    assert [column.key for column in columns] == ["email", "id", "updated_at"]
+
+    await create_user(db, email="ada@example.com")
+    r = await admin_client.get("/users", params={"fields": "email,first_name", "search": "ada@example.com"})
+    assert r.status_code == 200
+    assert r.json()["details"]["items"] == [{"email": "ada@example.com", "first_name": "Test"}]
+
+
+async def test_unknown_fields_are_rejected(admin_client):
+    r = await admin_client.get("/users", params={"fields": "email,password"})
+    assert r.status_code == 400
+    assert "password" in r.json()["message"]
+
+
+async def test_reordered_fields_share_the_cache_entry_and_etag(admin_client, superuser):
+    from src.utils.cache import shared_cache
+
+    first = await admin_client.get("/users", params={"fields": "email,id"})
+    hits = shared_cache.hits
+    second = await admin_client.get("/users", params={"fields": " id, email,id"})
+    assert second.status_code == 200 and shared_cache.hits == hits + 1
+    assert second.headers["etag"] == first.headers["etag"]
+    assert second.json()["details"]["items"] == [{"id": str(superuser.id), "email": "admin@example.com"}]
+
+    r = await admin_client.get("/users", params={"fields": "id,email"},
+                               headers={"if-none-match": first.headers["etag"]})
+    assert r.status_code == 304
+
+
+async def test_pages_past_the_end_report_no_items(admin_client, db):
+    for _ in range(2):
+        await create_user(db)
+
+    r = await admin_client.get("/users", params={"page": 10, "pageSize": 2})
+    details = r.json()["details"]
+    assert details["items"] == []
+    assert details["info"]["currentPageSize"] == 0 and details["info"]["totalItems"] == 3
+
+    r = await admin_client.get("/users", params={"page": 2, "pageSize": 2})
+    assert r.json()["details"]["info"]["currentPageSize"] == len(r.json()["details"]["items"]) == 1